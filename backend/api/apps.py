@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        import api.signals  # noqa: F401
+        from api.metrics import count_connection
+        from api.middleware import install_execute_wrappers
+
+        install_execute_wrappers()
+        connection_created.connect(
+            count_connection, dispatch_uid="api_count_connection"
+        )
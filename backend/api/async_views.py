@@ -0,0 +1,155 @@
+"""
+Асинхронные представления API для режима ASGI.
+
+Обслуживают чтение справочников, рецепта и выгрузку списка покупок без
+занятия потока воркера на время ожидания БД. Запрос проходит через
+экземпляр синхронного вьюсета: аутентификация, права, согласование
+формата, сериализация, кэш и обработка ошибок берутся у него, поэтому
+ответы совпадают с режимом WSGI. Остальные методы этих адресов
+передаются синхронным вьюсетам.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+from api.metrics import observe_latency
+from api.middleware import get_serializer_data
+from api.shopping_cart import (
+    get_cart_recipes,
+    get_export_format,
+    get_shopping_list,
+    make_export_response,
+    make_shopping_list,
+)
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+recipe_detail_sync = RecipeViewSet.as_view(
+    {
+        "get": "retrieve",
+        "put": "update",
+        "patch": "partial_update",
+        "delete": "destroy",
+    }
+)
+
+
+async def call_action(viewset, action, request, handler, **kwargs):
+    """
+    Выполнить корутину handler(view) для действия action вьюсета.
+
+    Вьюсет настраивается так же, как при диспетчеризации DRF, с
+    параметрами декоратора action. Ошибки обрабатывает handle_exception
+    вьюсета, ответ дорабатывает finalize_response.
+    """
+    view = viewset(**getattr(getattr(viewset, action), "kwargs", {}))
+    view.action_map = {"get": action, "head": action}
+    view.args = ()
+    view.kwargs = kwargs
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    try:
+        if request.method not in ("GET", "HEAD"):
+            raise exceptions.MethodNotAllowed(request.method)
+        await sync_to_async(view.initial)(view.request, **kwargs)
+        response = await handler(view)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return view.finalize_response(view.request, response, **kwargs)
+
+
+async def get_list_data(view):
+    """Данные ответа list вьюсета без пагинации"""
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    objects = [obj async for obj in queryset]
+    return get_serializer_data(view.get_serializer(objects, many=True))
+
+
+async def get_cached_list(view):
+    """Кэшированный ответ list справочного вьюсета"""
+    return await view.aget_cached_response(
+        view.request, lambda: get_list_data(view)
+    )
+
+
+@observe_latency("TagList", "list")
+async def tag_list(request):
+    """Список тегов"""
+    return await call_action(TagViewSet, "list", request, get_cached_list)
+
+
+async def get_cached_search(view):
+    """Кэшированный ответ поиска ингредиентов по индексу в памяти"""
+    return await view.aget_cached_response(
+        view.request,
+        sync_to_async(
+            partial(view.get_search_data, view.request.query_params["name"])
+        ),
+    )
+
+
+@observe_latency("IngredientList", "list")
+async def ingredient_list(request):
+    """Список ингредиентов с поиском по началу и вхождению названия"""
+    return await call_action(
+        IngredientViewSet,
+        "list",
+        request,
+        get_cached_search if "name" in request.GET else get_cached_list,
+    )
+
+
+async def retrieve_recipe(view):
+    """Рецепт с флагами пользователя по данным вьюсета"""
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    recipe = await queryset.filter(pk=view.kwargs["pk"]).afirst()
+    if recipe is None:
+        raise exceptions.NotFound()
+    view.check_object_permissions(view.request, recipe)
+    return Response(get_serializer_data(view.get_serializer(recipe)))
+
+
+@observe_latency("RecipeDetail", "retrieve")
+async def recipe_detail(request, pk):
+    """Рецепт с флагами пользователя, изменение передается вьюсету"""
+    if request.method != "GET":
+        return await sync_to_async(recipe_detail_sync)(request, pk=pk)
+
+    return await call_action(
+        RecipeViewSet, "retrieve", request, retrieve_recipe, pk=pk
+    )
+
+
+async def export_shopping_list(view):
+    """Выгрузка списка покупок, строки которого получены асинхронно"""
+    user = view.request.user
+    export_format = get_export_format(view.request)
+    return make_export_response(
+        export_format,
+        make_shopping_list(
+            [row async for row in get_shopping_list(user)],
+            [recipe async for recipe in get_cart_recipes(user)],
+        ),
+    )
+
+
+@observe_latency("RecipeViewSet", "download_shopping_cart")
+async def download_shopping_cart(request):
+    """Сгенерировать и отдать список покупок"""
+    return await call_action(
+        RecipeViewSet,
+        "download_shopping_cart",
+        request,
+        export_shopping_list,
+    )
+
+
+# csrf_exempt в Django 4.2 не поддерживает асинхронные представления
+for async_view in (
+    tag_list,
+    ingredient_list,
+    recipe_detail,
+    download_shopping_cart,
+):
+    async_view.csrf_exempt = True
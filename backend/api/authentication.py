@@ -0,0 +1,123 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.metrics import TOKEN_CACHE_REQUESTS
+from users.models import User
+
+
+class TokenCache:
+    """
+    Кэш соответствия токена пользователю в общем кэше Django.
+
+    Запись хранит только id пользователя, is_active и версию пользователя,
+    без его данных и хэша пароля. Версия меняется при каждом сохранении
+    пользователя, запись с другой версией считается промахом, удаление
+    токена удаляет его запись. Поэтому выход и изменение пользователя
+    действуют сразу во всех процессах.
+    """
+
+    @staticmethod
+    def get_cache_key(key):
+        """Ключ общего кэша без открытого значения токена"""
+        return "auth:token:" + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def get_version_key(user_id):
+        """Ключ версии пользователя"""
+        return f"auth:user:{user_id}:version"
+
+    def get_version(self, user_id):
+        """
+        Текущая версия пользователя.
+
+        Версия создается при первом обращении и не повторяется, поэтому
+        вытеснение ключа версии из кэша только делает записи промахами.
+        """
+        return cache.get_or_set(
+            self.get_version_key(user_id), lambda: uuid.uuid4().hex, None
+        )
+
+    def get(self, key):
+        """id пользователя и is_active из кэша или None"""
+        entry = cache.get(self.get_cache_key(key))
+        if entry is not None:
+            user_id, is_active, version = entry
+            if cache.get(self.get_version_key(user_id)) == version:
+                TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+                return user_id, is_active
+
+        TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    def set(self, key, user):
+        """Сохранить пользователя токена с его текущей версией"""
+        cache.set(
+            self.get_cache_key(key),
+            (user.pk, user.is_active, self.get_version(user.pk)),
+            settings.TOKEN_CACHE_TIMEOUT,
+        )
+
+    def delete(self, key):
+        """Сбросить запись токена"""
+        cache.delete(self.get_cache_key(key))
+
+    def invalidate_user(self, user_id):
+        """Сбросить записи всех токенов пользователя сменой версии"""
+        cache.set(self.get_version_key(user_id), uuid.uuid4().hex, None)
+
+
+token_cache = TokenCache()
+
+
+def get_deferred_instance(model, **values):
+    """
+    Объект модели с известными полями values.
+
+    Остальные поля отложены и загружаются из БД при первом обращении.
+    """
+    return model.from_db(
+        router.db_for_read(model),
+        [field.attname for field in model._meta.concrete_fields],
+        [
+            values.get(field.attname, DEFERRED)
+            for field in model._meta.concrete_fields
+        ],
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без обращения к БД при попадании в кэш.
+
+    Кэш отключен при TOKEN_CACHE_TIMEOUT = 0.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+
+        entry = token_cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return (user, token)
+
+        user_id, is_active = entry
+        if not is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+
+        user = get_deferred_instance(User, id=user_id, is_active=is_active)
+        token = get_deferred_instance(Token, key=key, user_id=user_id)
+        token.user = user
+        return (user, token)
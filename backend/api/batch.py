@@ -0,0 +1,139 @@
+from django.db import connections, router, transaction
+from rest_framework.response import Response
+
+from api.serializers import BatchSerializer
+
+CREATED = "created"
+EXISTS = "exists"
+DELETED = "deleted"
+NOT_LINKED = "not_linked"
+NOT_FOUND = "not_found"
+SELF = "self"
+
+
+def insert_links(model, user, field, pks):
+    """
+    Создать связи пользователя одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает множество id объектов, связи с которыми действительно
+    созданы этим запросом.
+    """
+    opts = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    names = [
+        item.name
+        for item in opts.concrete_fields
+        if not item.primary_key and item.name not in ("user", field)
+    ]
+    defaults = [
+        opts.get_field(name).get_db_prep_save(
+            opts.get_field(name).get_default(), connection
+        )
+        for name in names
+    ]
+    columns = ", ".join(
+        quote_name(opts.get_field(name).column)
+        for name in ("user", field, *names)
+    )
+    row = "({})".format(", ".join(["%s"] * (len(names) + 2)))
+    target = quote_name(opts.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote_name(opts.db_table)} ({columns}) "
+            f"VALUES {', '.join([row] * len(pks))} "
+            f"ON CONFLICT DO NOTHING RETURNING {target}",
+            [value for pk in pks for value in (user.pk, pk, *defaults)],
+        )
+        return {result[0] for result in cursor.fetchall()}
+
+
+def delete_links(model, user, field, pks):
+    """
+    Удалить связи пользователя одним DELETE ... RETURNING.
+
+    Возвращает множество id объектов, связи с которыми действительно
+    удалены этим запросом.
+    """
+    opts = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    target = quote_name(opts.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(opts.db_table)} "
+            f"WHERE {quote_name(opts.get_field('user').column)} = %s "
+            f"AND {target} IN ({', '.join(['%s'] * len(pks))}) "
+            f"RETURNING {target}",
+            [user.pk, *pks],
+        )
+        return {result[0] for result in cursor.fetchall()}
+
+
+def apply_batch(
+    request,
+    model,
+    field,
+    targets,
+    on_created=None,
+    on_deleted=None,
+    rejected=None,
+):
+    """
+    Пакетное добавление (POST) или удаление (DELETE) связей пользователя.
+
+    Связи model пользователя с объектами targets из списка ids создаются
+    одним INSERT ... ON CONFLICT DO NOTHING или удаляются одним DELETE в
+    транзакции с обновлением производных данных, число запросов не
+    зависит от длины списка. Статусы
+    и колбэки строятся по строкам, которые вернул сам запрос, поэтому
+    параллельные запросы не учитываются дважды. Сигналы моделей при этом
+    не вызываются, производные данные обновляют on_created и on_deleted,
+    получающие множество id измененных объектов. rejected - статусы id,
+    которые не обрабатываются. Ответ содержит статус для каждого id.
+    """
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+    rejected = rejected or {}
+
+    found = set(
+        targets.filter(pk__in=ids)
+        .exclude(pk__in=rejected)
+        .values_list("pk", flat=True)
+    )
+    if request.method == "POST":
+        write, done, skipped = insert_links, CREATED, EXISTS
+        callback = on_created
+    else:
+        write, done, skipped = delete_links, DELETED, NOT_LINKED
+        callback = on_deleted
+
+    changed = set()
+    # Транзакция начинается с записи: в SQLite чтение перед ней не дает
+    # параллельным транзакциям дождаться блокировки на запись
+    with transaction.atomic():
+        if found:
+            changed = write(model, request.user, field, found)
+        if changed and callback is not None:
+            callback(changed)
+
+    return Response(
+        {
+            "results": [
+                {
+                    "id": pk,
+                    "status": (
+                        rejected[pk]
+                        if pk in rejected
+                        else done
+                        if pk in changed
+                        else skipped
+                        if pk in found
+                        else NOT_FOUND
+                    ),
+                }
+                for pk in ids
+            ]
+        }
+    )
@@ -0,0 +1,113 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+
+def get_cache_version(prefix):
+    """Текущая версия справочника, она же время его последнего изменения"""
+    key = f"api:{prefix}:version"
+    version = cache.get(key)
+    if version is not None:
+        return version
+
+    cache.add(key, time.time(), timeout=None)
+    return cache.get(key, time.time())
+
+
+async def aget_cache_version(prefix):
+    """Асинхронный вариант get_cache_version"""
+    key = f"api:{prefix}:version"
+    version = await cache.aget(key)
+    if version is not None:
+        return version
+
+    await cache.aadd(key, time.time(), timeout=None)
+    return await cache.aget(key, time.time())
+
+
+def bump_cache_version(prefix):
+    """Сделать устаревшими все закэшированные ответы справочника"""
+    cache.set(f"api:{prefix}:version", time.time(), timeout=None)
+
+
+def get_cache_key(prefix, request, version):
+    """Ключ кэша для пути и параметров запроса"""
+    query = sorted(request.GET.lists())
+    digest = hashlib.md5(
+        f"{request.path}?{query}".encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"api:{prefix}:{version}:{digest}"
+
+
+def make_cache_entry(data):
+    """ETag и байты JSON ответа для сохранения в кэше"""
+    content = JSONRenderer().render(data)
+    return (quote_etag(hashlib.sha1(content).hexdigest()), content)
+
+
+def get_entry_response(request, entry, version):
+    """Ответ из записи кэша, 304 при совпадении условного GET"""
+    etag, content = entry
+    response = HttpResponse(content, content_type="application/json")
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(version)
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(version), response=response
+    )
+
+
+class CachedResponseMixin:
+    """
+    Кэширование ответов list/retrieve для справочных данных.
+
+    В кэше хранятся готовые байты JSON и ETag, ключ строится из пути,
+    параметров запроса и версии справочника ``cache_prefix``. Версия
+    обновляется сигналами при изменении моделей. Условный GET с
+    совпавшим ETag или Last-Modified получает 304 без обращения к БД.
+    """
+
+    cache_prefix = None
+    cache_timeout = 60 * 60 * 24
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        """Ответ из кэша или построенный обработчиком и сохраненный"""
+        version = get_cache_version(self.cache_prefix)
+        key = get_cache_key(self.cache_prefix, request, version)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            entry = make_cache_entry(response.data)
+            cache.set(key, entry, self.cache_timeout)
+
+        return get_entry_response(request, entry, version)
+
+    async def aget_cached_response(self, request, get_data):
+        """
+        Асинхронный вариант get_cached_response.
+
+        get_data - корутина, возвращающая данные ответа.
+        """
+        version = await aget_cache_version(self.cache_prefix)
+        key = get_cache_key(self.cache_prefix, request, version)
+        entry = await cache.aget(key)
+        if entry is None:
+            entry = make_cache_entry(await get_data())
+            await cache.aset(key, entry, self.cache_timeout)
+
+        return get_entry_response(request, entry, version)
@@ -1,10 +1,10 @@
 from django_filters import (
+    CharFilter,
     TypedChoiceFilter,
     FilterSet,
     NumberFilter,
     ModelMultipleChoiceFilter,
 )
-from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe, Tag
 
@@ -35,6 +35,7 @@ class RecipeFilterSet(FilterSet):
         to_field_name="slug",
         queryset=Tag.objects.all(),
     )
+    search = CharFilter(method="get_search")
 
     class Meta:
         model = Recipe
@@ -43,6 +44,7 @@ class RecipeFilterSet(FilterSet):
             "is_in_shopping_cart",
             "author",
             "tags",
+            "search",
         )
 
     def get_is_favorited(self, queryset, field_name, value):
@@ -50,7 +52,7 @@ class RecipeFilterSet(FilterSet):
         if value:
             user = self.request.user
             if user.is_authenticated:
-                queryset = queryset.filter(favorite__user=user)
+                queryset = queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, field_name, value):
@@ -58,11 +60,9 @@ class RecipeFilterSet(FilterSet):
         if value:
             user = self.request.user
             if user.is_authenticated:
-                queryset = queryset.filter(cart__user=user)
+                queryset = queryset.filter(is_in_shopping_cart=True)
         return queryset
 
-
-class NameSearchFilter(SearchFilter):
-    """Поисковый фильтр по ключевому слову 'name'"""
-
-    search_param = "name"
+    def get_search(self, queryset, field_name, value):
+        """Поиск по названию, описанию и ингредиентам с ранжированием"""
+        return queryset.search(value)
@@ -0,0 +1,66 @@
+import threading
+from bisect import bisect_left
+
+from api.cache import get_cache_version
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """
+    Поисковый индекс ингредиентов в памяти процесса.
+
+    Хранит ингредиенты, отсортированные по названию в нижнем регистре.
+    Загружается при первом обращении и перестраивается, когда сигналы
+    сохранения/удаления модели Ingredient меняют версию справочника
+    в общем кэше, поэтому изменения видны всем процессам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        """Загрузить ингредиенты из БД и построить индекс"""
+        version = get_cache_version("ingredients")
+        data = self._data
+        if data is not None and data[0] == version:
+            return data
+
+        with self._lock:
+            if self._data is None or self._data[0] != version:
+                ingredients = sorted(
+                    Ingredient.objects.all(),
+                    key=lambda ingredient: ingredient.name.casefold(),
+                )
+                keys = [
+                    ingredient.name.casefold() for ingredient in ingredients
+                ]
+                self._data = (version, keys, ingredients)
+
+        return self._data
+
+    def search(self, query):
+        """
+        Поиск ингредиентов по названию.
+
+        Сначала идут названия, начинающиеся с запроса, затем названия,
+        содержащие запрос. Совпадения по началу находятся бинарным
+        поиском, вхождения - линейным проходом по всем названиям в
+        памяти, который для справочника в тысячи записей дешевле
+        запроса к БД.
+        """
+        _, keys, ingredients = self._load()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+
+        return ingredients[start:end] + [
+            ingredient
+            for key, ingredient in zip(keys, ingredients)
+            if query in key and not key.startswith(query)
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,13 @@
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, digits=2):
+    """p50/p95/p99 времени выполнения в миллисекундах"""
+    return {
+        f"p{percent}_ms": round(percentile(latencies, percent), digits)
+        for percent in (50, 95, 99)
+    }
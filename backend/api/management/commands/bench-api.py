@@ -0,0 +1,140 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.management.bench import summarize
+from api.management.commands.seed_bench import BENCH_PREFIX
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк основных эндпоинтов API на данных seed_bench.
+
+    По умолчанию запросы выполняются тестовым клиентом Django в текущем
+    процессе с подсчетом SQL-запросов. С --base-url запросы уходят на
+    запущенный сервер в --concurrency потоков. Результат выводится в JSON:
+    p50/p95/p99 в миллисекундах, пропускная способность и запросы к БД.
+    """
+
+    help = "Benchmark API endpoints and print latency percentiles as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--base-url")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        user = (
+            User.objects.filter(username__startswith=BENCH_PREFIX)
+            .order_by("pk")
+            .first()
+        )
+        if user is None:
+            self.stderr.write("Нет данных для бенчмарка, выполните seed_bench")
+            return
+        token, _ = Token.objects.get_or_create(user=user)
+        self.headers = {"Authorization": f"Token {token.key}"}
+        self.base_url = options["base_url"]
+        if self.base_url is None:
+            self.client = Client(HTTP_HOST="localhost")
+
+        report = {
+            "mode": "http" if self.base_url else "client",
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "endpoints": {},
+        }
+        for name, make_path in self.get_scenarios().items():
+            for _ in range(options["warmup"]):
+                self.request(make_path())
+            paths = [make_path() for _ in range(options["requests"])]
+            report["endpoints"][name] = self.run(paths, options["concurrency"])
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def get_scenarios(self):
+        """Генераторы путей запросов для каждого сценария"""
+        recipe_ids = list(
+            Recipe.objects.order_by("pk").values_list("pk", flat=True)
+        )
+        tags = list(Tag.objects.order_by("pk").values_list("slug", flat=True))
+        names = list(
+            Ingredient.objects.order_by("pk").values_list("name", flat=True)
+        )
+        choice = self.random.choice
+        return {
+            "recipes_list": lambda: "/api/recipes/?limit=6",
+            "recipes_filtered": lambda: (
+                f"/api/recipes/?tags={choice(tags)}&is_favorited=1&limit=6"
+            ),
+            "recipe_detail": lambda: f"/api/recipes/{choice(recipe_ids)}/",
+            "subscriptions": lambda: (
+                "/api/users/subscriptions/?limit=6&recipes_limit=3"
+            ),
+            "download_shopping_cart": lambda: (
+                "/api/recipes/download_shopping_cart/"
+            ),
+            "ingredient_search": lambda: (
+                f"/api/ingredients/?name={choice(names)[:3]}"
+            ),
+        }
+
+    def request(self, path):
+        """Выполняет запрос, возвращает время (с) и число SQL-запросов"""
+        if self.base_url is not None:
+            started = time.perf_counter()
+            with urlopen(
+                Request(self.base_url.rstrip("/") + path, headers=self.headers)
+            ) as response:
+                response.read()
+            return time.perf_counter() - started, None
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(
+                path, HTTP_AUTHORIZATION=self.headers["Authorization"]
+            )
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: HTTP {response.status_code}")
+        return elapsed, len(queries)
+
+    def run(self, paths, concurrency):
+        """Прогон сценария и сводная статистика"""
+        started = time.perf_counter()
+        if self.base_url is not None and concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(self.request, paths))
+        else:
+            results = [self.request(path) for path in paths]
+        total = time.perf_counter() - started
+
+        latencies = [elapsed * 1000 for elapsed, _ in results]
+        stats = summarize(latencies)
+        stats["throughput_rps"] = round(len(paths) / total, 1)
+        queries = [count for _, count in results if count is not None]
+        if queries:
+            stats["queries_per_request"] = round(
+                sum(queries) / len(queries), 2
+            )
+        return stats
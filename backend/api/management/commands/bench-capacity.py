@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from api.management.bench import summarize
+from api.management.commands.seed_bench import BENCH_PREFIX
+from users.models import User
+
+PATHS = (
+    "/api/tags/",
+    "/api/ingredients/",
+    "/api/recipes/{recipe_id}/",
+    "/api/recipes/download_shopping_cart/",
+)
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест запущенного сервера с ростом числа соединений.
+
+    Для каждого уровня --concurrency клиенты в течение --duration секунд
+    по кругу запрашивают справочники, рецепт и выгрузку списка покупок.
+    Запуск против сервера в режимах SERVER_MODE=wsgi и SERVER_MODE=asgi
+    с одинаковым числом воркеров сравнивает их пропускную способность
+    и задержки под нагрузкой.
+    """
+
+    help = "Load test a running server at increasing concurrency levels"
+
+    def add_arguments(self, parser):
+        parser.add_argument("base_url")
+        parser.add_argument("--concurrency", default="1,8,32,128")
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument("--recipe-id", type=int, default=1)
+        parser.add_argument("--timeout", type=float, default=30)
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.filter(username__startswith=BENCH_PREFIX)
+            .order_by("pk")
+            .first()
+        )
+        if user is None:
+            self.stderr.write("Нет данных для бенчмарка, выполните seed_bench")
+            return
+        token, _ = Token.objects.get_or_create(user=user)
+        self.headers = {"Authorization": f"Token {token.key}"}
+        self.timeout = options["timeout"]
+        self.urls = [
+            options["base_url"].rstrip("/")
+            + path.format(recipe_id=options["recipe_id"])
+            for path in PATHS
+        ]
+
+        report = {}
+        for level in map(int, options["concurrency"].split(",")):
+            report[level] = self.run(level, options["duration"])
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def client(self, deadline, latencies, errors, lock):
+        """Клиент, выполняющий запросы до истечения времени теста"""
+        number = 0
+        while time.monotonic() < deadline:
+            url = self.urls[number % len(self.urls)]
+            number += 1
+            started = time.perf_counter()
+            try:
+                with urlopen(
+                    Request(url, headers=self.headers), timeout=self.timeout
+                ) as response:
+                    response.read()
+            except (URLError, OSError):
+                with lock:
+                    errors.append(url)
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    def run(self, concurrency, duration):
+        """Прогон одного уровня нагрузки"""
+        latencies, errors, lock = [], [], threading.Lock()
+        started = time.monotonic()
+        with ThreadPoolExecutor(concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(
+                    self.client,
+                    started + duration,
+                    latencies,
+                    errors,
+                    lock,
+                )
+        elapsed = time.monotonic() - started
+
+        stats = summarize(latencies) if latencies else {}
+        stats["requests"] = len(latencies)
+        stats["errors"] = len(errors)
+        stats["throughput_rps"] = round(len(latencies) / elapsed, 1)
+        return stats
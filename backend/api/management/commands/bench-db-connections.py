@@ -0,0 +1,67 @@
+import json
+import time
+
+from django.core.management import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+from api.management.bench import summarize
+
+POOLED_ENGINE = "foodgram.db"
+POSTGRES_ENGINE = "django.db.backends.postgresql"
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк стоимости установки соединения с БД.
+
+    Имитирует цикл запроса: закрытие устаревшего соединения в начале,
+    один SELECT 1, закрытие в конце. Сравниваются режимы без повторного
+    использования соединений (CONN_MAX_AGE=0), с постоянными соединениями
+    и, для PostgreSQL, с пулом соединений foodgram.db.
+    """
+
+    help = "Measure per-request database connection overhead"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options["database"]].settings_dict
+        engine = settings_dict["ENGINE"]
+        if engine == POOLED_ENGINE:
+            engine = POSTGRES_ENGINE
+        modes = {
+            "new_connection": (engine, {"CONN_MAX_AGE": 0}),
+            "persistent": (engine, {"CONN_MAX_AGE": None}),
+        }
+        if engine == POSTGRES_ENGINE:
+            modes["pooled"] = (POOLED_ENGINE, {"CONN_MAX_AGE": 0})
+
+        report = {}
+        for mode, (mode_engine, overrides) in modes.items():
+            wrapper = load_backend(mode_engine).DatabaseWrapper(
+                {**settings_dict, "ENGINE": mode_engine, **overrides},
+                f"bench_{mode}",
+            )
+            try:
+                report[mode] = self.run(wrapper, options["iterations"])
+            finally:
+                wrapper.close()
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, wrapper, iterations):
+        """Время цикла запроса в миллисекундах"""
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            wrapper.close_if_unusable_or_obsolete()
+            latencies.append((time.perf_counter() - started) * 1000)
+        stats = summarize(latencies, digits=3)
+        stats["mean_ms"] = round(sum(latencies) / len(latencies), 3)
+        return stats
@@ -0,0 +1,91 @@
+import base64
+import json
+import multiprocessing
+import os
+import resource
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand
+from PIL import Image
+from rest_framework import serializers
+
+from api.serializers import Base64ImageField
+
+
+def legacy_decode(data):
+    """Прежнее декодирование: split и b64decode всей строки"""
+    format, imgstr = data.split(";base64,")
+    ext = format.split("/")[-1]
+    field = serializers.ImageField()
+    return field.to_internal_value(
+        ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+    )
+
+
+def streaming_decode(data):
+    """Потоковое декодирование Base64ImageField"""
+    field = Base64ImageField()
+    field.field_name = "image"
+    return field.to_internal_value(data)
+
+
+DECODERS = {
+    "legacy": legacy_decode,
+    "streaming": streaming_decode,
+}
+
+
+def measure(decoder, data, queue):
+    """Прирост пикового RSS процесса при декодировании, в КБ"""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    DECODERS[decoder](data)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put(after - before)
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк памяти при загрузке изображения рецепта в base64.
+
+    Каждое декодирование выполняется в отдельном дочернем процессе,
+    выводится прирост пикового RSS для прежнего и потокового способа.
+    """
+
+    help = "Measure peak RSS per base64 image upload"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--width", type=int, default=1800)
+        parser.add_argument("--height", type=int, default=1800)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def make_payload(self, width, height):
+        """Несжимаемое PNG изображение в виде data URL"""
+        image = Image.frombytes(
+            "RGB", (width, height), os.urandom(width * height * 3)
+        )
+        buffer = BytesIO()
+        image.save(buffer, "PNG")
+        return (
+            "data:image/png;base64,"
+            + base64.b64encode(buffer.getvalue()).decode(),
+            buffer.tell(),
+        )
+
+    def handle(self, *args, **options):
+        data, size = self.make_payload(options["width"], options["height"])
+        context = multiprocessing.get_context("fork")
+        report = {"image_bytes": size, "payload_bytes": len(data)}
+        for decoder in DECODERS:
+            results = []
+            for _ in range(options["repeat"]):
+                queue = context.Queue()
+                process = context.Process(
+                    target=measure, args=(decoder, data, queue)
+                )
+                process.start()
+                results.append(queue.get())
+                process.join()
+            report[f"{decoder}_peak_rss_kb"] = max(results)
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,234 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Follow, User
+
+BENCH_PREFIX = "bench_"
+TAGS = (
+    ("Завтрак", "#E26C2D", "breakfast"),
+    ("Обед", "#49B64E", "lunch"),
+    ("Ужин", "#8775D2", "dinner"),
+)
+
+
+class Command(BaseCommand):
+    """
+    Команда наполнения БД данными для бенчмарков.
+
+    Создает пользователей, рецепты с ингредиентами и тегами, подписки,
+    избранное и списки покупок пачками bulk_create. Генератор случайных
+    чисел инициализируется --seed, поэтому набор данных воспроизводим.
+    Ингредиенты берутся из справочника (load-ingredients).
+    """
+
+    help = "Generate reproducible benchmark data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=10)
+        parser.add_argument("--follows-per-user", type=int, default=20)
+        parser.add_argument("--favorites-per-user", type=int, default=10)
+        parser.add_argument("--carts-per-user", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def log(self, message):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"[{elapsed:7.1f} с] {message}")
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        ingredient_ids = list(Ingredient.objects.values_list("pk", flat=True))
+        if not ingredient_ids:
+            self.stderr.write(
+                "Справочник ингредиентов пуст, выполните load-ingredients"
+            )
+            return
+
+        tag_ids = self.create_tags()
+        user_ids = self.create_users(options["users"])
+        recipe_ids = self.create_recipes(
+            options["recipes"],
+            user_ids,
+            tag_ids,
+            ingredient_ids,
+            options["ingredients_per_recipe"],
+        )
+        self.create_links(
+            Follow,
+            "author_id",
+            user_ids,
+            user_ids,
+            options["follows_per_user"],
+        )
+        self.create_links(
+            Favorite,
+            "recipe_id",
+            user_ids,
+            recipe_ids,
+            options["favorites_per_user"],
+        )
+        self.create_links(
+            ShoppingCart,
+            "recipe_id",
+            user_ids,
+            recipe_ids,
+            options["carts_per_user"],
+        )
+        call_command("backfill-feed", stdout=self.stdout)
+        Recipe.objects.update_search_vector()
+        call_command("recount", batch_size=self.batch_size, stdout=self.stdout)
+        self.log("Готово")
+
+    def create_tags(self):
+        """Теги рецептов"""
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={"name": name, "color": color}
+            )
+        return list(Tag.objects.values_list("pk", flat=True))
+
+    def create_users(self, count):
+        """Пользователи с общим паролем bench"""
+        password = make_password("bench")
+        start = User.objects.filter(username__startswith=BENCH_PREFIX).count()
+        for offset in range(start, count, self.batch_size):
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=f"{BENCH_PREFIX}{number}",
+                        email=f"{BENCH_PREFIX}{number}@example.com",
+                        first_name="Bench",
+                        last_name=str(number),
+                        password=password,
+                    )
+                    for number in range(
+                        offset, min(offset + self.batch_size, count)
+                    )
+                ]
+            )
+        self.log(f"Пользователей: {count}")
+        return list(
+            User.objects.filter(username__startswith=BENCH_PREFIX)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:count]
+        )
+
+    def create_recipes(
+        self, count, user_ids, tag_ids, ingredient_ids, per_recipe
+    ):
+        """
+        Рецепты с датами за последний год, тегами и ингредиентами.
+
+        bulk_create заполняет created текущим временем (auto_now_add),
+        поэтому даты, разнесенные по году, записываются следом
+        bulk_update той же пачки.
+        """
+        now = timezone.now()
+        recipe_ids = []
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            dates = [
+                now - timedelta(seconds=self.random.randint(0, 365 * 86400))
+                for _ in range(size)
+            ]
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    [
+                        Recipe(
+                            author_id=self.random.choice(user_ids),
+                            name=f"Рецепт {offset + number}",
+                            text="Описание рецепта для бенчмарка",
+                            image="media/recipes/bench.png",
+                            cooking_time=self.random.randint(5, 180),
+                        )
+                        for number in range(size)
+                    ]
+                )
+                for recipe, created in zip(recipes, dates):
+                    recipe.created = created
+                Recipe.objects.bulk_update(
+                    recipes, ["created"], batch_size=self.batch_size
+                )
+                self.bulk_create_relations(
+                    recipes, tag_ids, ingredient_ids, per_recipe
+                )
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+            self.log(f"Рецептов: {len(recipe_ids)}")
+        return recipe_ids
+
+    def bulk_create_relations(
+        self, recipes, tag_ids, ingredient_ids, per_recipe
+    ):
+        """Теги и ингредиенты пачки рецептов"""
+        Tags = Recipe.tags.through
+        Tags.objects.bulk_create(
+            [
+                Tags(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, len(tag_ids))
+                )
+            ],
+            batch_size=self.batch_size,
+        )
+        IngredientRecipe.objects.bulk_create(
+            [
+                IngredientRecipe(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, min(per_recipe, len(ingredient_ids))
+                )
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def create_links(self, model, field, user_ids, target_ids, per_user):
+        """
+        Связи пользователей: подписки, избранное, список покупок.
+
+        Для подписок (model Follow) пользователь исключается из своих целей.
+        """
+        exclude_self = model is Follow
+        per_user = min(per_user, len(target_ids) - exclude_self)
+        links = []
+        for user_id in user_ids:
+            targets = [
+                target_id
+                for target_id in self.random.sample(
+                    target_ids, per_user + exclude_self
+                )
+                if not exclude_self or target_id != user_id
+            ]
+            links.extend(
+                model(user_id=user_id, **{field: target_id})
+                for target_id in targets[:per_user]
+            )
+            if len(links) >= self.batch_size:
+                model.objects.bulk_create(links, ignore_conflicts=True)
+                links = []
+        model.objects.bulk_create(links, ignore_conflicts=True)
+        self.log(
+            f"{model._meta.verbose_name_plural}: до {per_user} на пользователя"
+        )
@@ -0,0 +1,152 @@
+"""
+Метрики API в формате Prometheus.
+
+При заданной переменной окружения PROMETHEUS_MULTIPROC_DIR значения
+хранятся в mmap-файлах этого каталога и суммируются по всем воркерам
+gunicorn при выдаче /api/metrics. Переменную задает gunicorn.conf.py,
+остальные процессы (manage.py) без нее пишут метрики только в память.
+"""
+import hmac
+import os
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7)
+
+# prometheus_client создает mmap-файл метрики в этом каталоге и падает,
+# если каталога еще нет
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+REQUEST_LATENCY = Histogram(
+    "foodgram_request_duration_seconds",
+    "Время обработки запроса по действиям вьюсетов",
+    ["view", "action", "method", "status"],
+)
+SHOPPING_CART_EXPORT_BYTES = Histogram(
+    "foodgram_shopping_cart_export_bytes",
+    "Размер выгрузки списка покупок",
+    ["format"],
+    buckets=BYTES_BUCKETS,
+)
+SHOPPING_CART_EXPORT_DURATION = Histogram(
+    "foodgram_shopping_cart_export_duration_seconds",
+    "Время выгрузки списка покупок",
+    ["format"],
+)
+IMAGE_DECODE_BYTES = Histogram(
+    "foodgram_image_decode_bytes",
+    "Размер декодированных изображений рецептов",
+    buckets=BYTES_BUCKETS,
+)
+TOKEN_CACHE_REQUESTS = Counter(
+    "foodgram_token_cache_requests",
+    "Обращения к кэшу токенов по результату",
+    ["result"],
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "foodgram_db_connections_opened",
+    "Открытые физические соединения с БД",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "foodgram_db_pool_checkouts",
+    "Выдача соединений пулом: reused - свободное, opened - новое",
+    ["result"],
+)
+
+
+def count_connection(sender, connection, **kwargs):
+    """
+    Подсчет новых соединений с БД.
+
+    Бэкенд с пулом отправляет connection_created при каждой выдаче
+    соединения из пула, его соединения считает сам бэкенд.
+    """
+    if not getattr(connection, "pooled", False):
+        DB_CONNECTIONS_OPENED.inc()
+
+
+class LatencyMetricsMixin:
+    """Замер времени обработки запроса с меткой действия вьюсета"""
+
+    def dispatch(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().dispatch(request, *args, **kwargs)
+        REQUEST_LATENCY.labels(
+            view=type(self).__name__,
+            action=getattr(self, "action", None) or "unknown",
+            method=request.method,
+            status=response.status_code,
+        ).observe(time.perf_counter() - start)
+        return response
+
+
+def observe_export(export_format, chunks):
+    """Подсчет размера и времени выгрузки списка покупок по частям"""
+    start = time.perf_counter()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk.encode())
+        yield chunk
+    SHOPPING_CART_EXPORT_BYTES.labels(format=export_format).observe(size)
+    SHOPPING_CART_EXPORT_DURATION.labels(format=export_format).observe(
+        time.perf_counter() - start
+    )
+
+
+def observe_latency(view, action):
+    """Замер времени обработки запроса асинхронным представлением"""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            response = await func(request, *args, **kwargs)
+            REQUEST_LATENCY.labels(
+                view=view,
+                action=action,
+                method=request.method,
+                status=response.status_code,
+            ).observe(time.perf_counter() - start)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def metrics_view(request):
+    """
+    Выдача метрик в текстовом формате Prometheus.
+
+    Доступна только с токеном METRICS_TOKEN, без настроенного токена
+    адрес не существует.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(),
+        f"Bearer {settings.METRICS_TOKEN}".encode(),
+    ):
+        return HttpResponseForbidden()
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,205 @@
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Счетчики запроса: число и время SQL запросов, время сериализации"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL запросов соединения"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+
+def execute_with_metrics(execute, sql, params, many, context):
+    """Учет SQL запроса в метриках текущего запроса, если они включены"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """
+    Обертка SQL запросов соединения.
+
+    Метрики передаются через ContextVar, поэтому учитываются и запросы
+    асинхронных представлений, выполняемые в потоках sync_to_async.
+    """
+    if execute_with_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_with_metrics)
+
+
+def install_execute_wrappers():
+    """
+    Обертка SQL запросов для уже открытых и всех новых соединений.
+
+    Вызывается из ApiConfig.ready, чтобы учет не зависел от того, было ли
+    соединение открыто до импорта этого модуля.
+    """
+    for connection in connections.all(initialized_only=True):
+        install_execute_wrapper(connection)
+    connection_created.connect(
+        install_execute_wrapper, dispatch_uid="api_execute_wrapper"
+    )
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Учет времени сериализации в метриках текущего запроса.
+
+    Учитывается только внешний замер, вложенные сериализаторы входят в
+    его время, как и ленивые SQL запросы во время сериализации.
+    """
+    metrics = current_metrics.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+
+    metrics.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        metrics.serializer_time += time.perf_counter() - start
+
+
+def get_serializer_data(serializer):
+    """Данные сериализатора с замером времени сериализации"""
+    with measure_serialization():
+        return serializer.data
+
+
+class SerializerMetricsMixin:
+    """
+    Замер времени сериализации ответов list и retrieve вьюсета.
+
+    Повторяет list и retrieve DRF, обращаясь к serializer.data через
+    get_serializer_data, остальные действия замеряют данные так же явно.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                get_serializer_data(self.get_serializer(page, many=True))
+            )
+
+        return Response(
+            get_serializer_data(self.get_serializer(queryset, many=True))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(
+            get_serializer_data(self.get_serializer(self.get_object()))
+        )
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики запросов к API.
+
+    Для доли запросов REQUEST_METRICS_SAMPLE_RATE считает SQL запросы без
+    DEBUG, время SQL, сериализации и всего запроса. Результат уходит в
+    заголовок Server-Timing и строку лога в JSON, при превышении бюджета
+    запросов представления пишется предупреждение.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        context_token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(context_token)
+
+        self.report(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        context_token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(context_token)
+
+        self.report(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def report(self, request, response, metrics, total_time):
+        """Заголовок Server-Timing, строка лога и проверка бюджета"""
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        response["Server-Timing"] = ", ".join(
+            (
+                f"db;dur={metrics.sql_time * 1000:.1f};"
+                f'desc="{metrics.queries} queries"',
+                f"serializer;dur={metrics.serializer_time * 1000:.1f}",
+                f"total;dur={total_time * 1000:.1f}",
+            )
+        )
+        record = {
+            "view": view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "sql_ms": round(metrics.sql_time * 1000, 1),
+            "serializer_ms": round(metrics.serializer_time * 1000, 1),
+            "total_ms": round(total_time * 1000, 1),
+        }
+        logger.info(json.dumps(record))
+
+        budget = settings.REQUEST_METRICS_VIEW_QUERY_BUDGETS.get(
+            view_name, settings.REQUEST_METRICS_QUERY_BUDGET
+        )
+        if metrics.queries > budget:
+            logger.warning(
+                json.dumps({**record, "event": "query_budget_exceeded"})
+            )
@@ -0,0 +1,139 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CustomPaginator(PageNumberPagination):
+    """Настройки пагинатора"""
+
+    page_size = 6
+    page_size_query_param = "limit"
+
+
+class RecipePaginator(CustomPaginator):
+    """
+    Пагинатор ленты рецептов.
+
+    По умолчанию работает постранично. Если передан параметр cursor
+    (пустой для первой страницы), переключается на keyset-пагинацию по
+    (created, id): без COUNT(*) и OFFSET, поэтому время ответа не зависит
+    от глубины страницы. Сортировка в этом режиме всегда от новых к старым.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор"
+
+    def is_cursor_mode(self, request):
+        """Включен ли режим keyset-пагинации"""
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_mode(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        if position is None:
+            queryset = queryset.order_by("-created", "-id")
+        elif reverse:
+            created, pk = position
+            queryset = queryset.filter(
+                Q(created__gt=created) | Q(created=created, id__gt=pk)
+            ).order_by("created", "id")
+        else:
+            created, pk = position
+            queryset = queryset.filter(
+                Q(created__lt=created) | Q(created=created, id__lt=pk)
+            ).order_by("-created", "-id")
+
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.results = results
+        return results
+
+    def decode_cursor(self, request):
+        """Позиция (created, id) и направление из параметра cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            created, pk, direction = (
+                base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            )
+            return (datetime.fromisoformat(created), int(pk)), direction == "p"
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse):
+        """Ссылка на страницу после/до рецепта"""
+        position = "|".join(
+            (
+                recipe.created.isoformat(),
+                str(recipe.pk),
+                "p" if reverse else "n",
+            )
+        )
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(position.encode()).decode(),
+        )
+
+    def get_first_link(self):
+        """Ссылка на первую страницу без выхода из режима курсора"""
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, ""
+        )
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        if not self.results:
+            # Пустая страница назад: новее курсора рецептов нет, и все
+            # рецепты начиная с него попадают на первую страницу
+            return self.get_first_link()
+        return self.encode_cursor(self.results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if not self.results:
+            return self.get_first_link()
+        return self.encode_cursor(self.results[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+
+class FeedPaginator(RecipePaginator):
+    """Пагинатор ленты подписок, всегда в режиме keyset-пагинации"""
+
+    def is_cursor_mode(self, request):
+        return True
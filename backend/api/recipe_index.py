@@ -0,0 +1,246 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import IngredientRecipe
+
+CHANGES_KEY = "api:recipe_index:changes"
+CHANGE_TIMEOUT = 60 * 60
+MAX_PENDING_CHANGES = 1000
+
+
+def mark_changed(recipe_id):
+    """
+    Записать изменение состава рецепта в общий журнал.
+
+    Журнал - счетчик в кэше и по ключу на каждое изменение, индексы
+    всех процессов применяют новые записи при следующем обращении.
+    """
+    if cache.add(CHANGES_KEY, 1, timeout=None):
+        number = 1
+    else:
+        number = cache.incr(CHANGES_KEY)
+    cache.set(f"{CHANGES_KEY}:{number}", recipe_id, CHANGE_TIMEOUT)
+
+
+def schedule_refresh(recipe_id):
+    """Отметить изменение рецепта после фиксации транзакции"""
+    transaction.on_commit(lambda: mark_changed(recipe_id))
+
+
+def grow(sizes, recipe_id):
+    """Дополнить массив числа ингредиентов нулями до индекса recipe_id"""
+    if recipe_id >= len(sizes):
+        sizes.frombytes(bytes(sizes.itemsize * (recipe_id + 1 - len(sizes))))
+
+
+def contains(recipe_ids, recipe_id):
+    """Есть ли recipe_id в отсортированном массиве"""
+    position = bisect_left(recipe_ids, recipe_id)
+    return position < len(recipe_ids) and recipe_ids[position] == recipe_id
+
+
+def discard(recipe_ids, recipe_id):
+    """Удалить recipe_id из отсортированного массива, если он там есть"""
+    position = bisect_left(recipe_ids, recipe_id)
+    if position < len(recipe_ids) and recipe_ids[position] == recipe_id:
+        del recipe_ids[position]
+
+
+def probing_is_cheaper(probes, recipe_ids):
+    """Дешевле ли бинарный поиск probes значений, чем проход по массиву"""
+    return probes * len(recipe_ids).bit_length() < len(recipe_ids)
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта - число его ингредиентов в массиве, индексом
+    которого служит id рецепта, и для каждого числа ингредиентов -
+    отсортированный массив рецептов с таким числом. Строится из
+    IngredientRecipe при первом обращении и дополняется по журналу
+    изменений mark_changed. Если журнал отстал больше чем на
+    MAX_PENDING_CHANGES записей или записи истекли, индекс строится
+    заново.
+
+    Журнал хранится в кэше Django и доходит до других воркеров только с
+    общим кэшем (CACHE_BACKEND, например Redis или Memcached). С кэшем по
+    умолчанию LocMemCache изменения видит лишь воркер, который их внес.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._applied = None
+        self._postings = {}
+        self._sizes = array("I")
+        self._by_size = {}
+
+    def _build(self, applied):
+        """
+        Построить индекс по всем связям рецептов с ингредиентами.
+
+        Строки читаются по порядку ингредиента и рецепта и добавляются
+        сразу в массивы, промежуточных списков не создается.
+        """
+        postings = defaultdict(lambda: array("i"))
+        sizes = array("I")
+        rows = (
+            IngredientRecipe.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator(chunk_size=10000)
+        )
+        for ingredient_id, recipe_id in rows:
+            postings[ingredient_id].append(recipe_id)
+            grow(sizes, recipe_id)
+            sizes[recipe_id] += 1
+
+        by_size = defaultdict(lambda: array("i"))
+        for recipe_id, size in enumerate(sizes):
+            if size:
+                by_size[size].append(recipe_id)
+
+        self._postings = dict(postings)
+        self._sizes = sizes
+        self._by_size = dict(by_size)
+        self._applied = applied
+
+    def _apply(self, recipe_ids):
+        """
+        Перечитать состав изменившихся рецептов.
+
+        Из каждого массива рецептов id изменившихся рецептов удаляются
+        бинарным поиском, если их мало, или одним проходом по массиву.
+        """
+        changed = sorted(recipe_ids)
+        changed_set = set(changed)
+        for ingredient_id, ingredient_recipes in self._postings.items():
+            if (
+                not ingredient_recipes
+                or changed[-1] < ingredient_recipes[0]
+                or changed[0] > ingredient_recipes[-1]
+            ):
+                continue
+            if probing_is_cheaper(len(changed), ingredient_recipes):
+                for recipe_id in changed:
+                    discard(ingredient_recipes, recipe_id)
+            else:
+                self._postings[ingredient_id] = array(
+                    "i",
+                    (
+                        recipe_id
+                        for recipe_id in ingredient_recipes
+                        if recipe_id not in changed_set
+                    ),
+                )
+
+        sizes = self._sizes
+        for recipe_id in changed:
+            if recipe_id < len(sizes) and sizes[recipe_id]:
+                discard(self._by_size[sizes[recipe_id]], recipe_id)
+                sizes[recipe_id] = 0
+        rows = IngredientRecipe.objects.filter(
+            recipe_id__in=changed
+        ).values_list("ingredient_id", "recipe_id")
+        for ingredient_id, recipe_id in rows:
+            insort(
+                self._postings.setdefault(ingredient_id, array("i")),
+                recipe_id,
+            )
+            grow(sizes, recipe_id)
+            sizes[recipe_id] += 1
+        for recipe_id in changed:
+            if recipe_id < len(sizes) and sizes[recipe_id]:
+                insort(
+                    self._by_size.setdefault(sizes[recipe_id], array("i")),
+                    recipe_id,
+                )
+
+    def _refresh(self):
+        """Привести индекс к последней записи журнала изменений"""
+        current = cache.get(CHANGES_KEY, 0)
+        if self._applied is not None and current == self._applied:
+            return
+
+        if (
+            self._applied is None
+            or current < self._applied
+            or current - self._applied > MAX_PENDING_CHANGES
+        ):
+            self._build(current)
+            return
+
+        keys = [
+            f"{CHANGES_KEY}:{number}"
+            for number in range(self._applied + 1, current + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            self._build(current)
+            return
+
+        self._apply(set(changes.values()))
+        self._applied = current
+
+    def match(self, ingredient_ids, max_missing):
+        """
+        Рецепты, которым не хватает не больше max_missing ингредиентов.
+
+        Возвращает список (id рецепта, покрытие, недостающих), покрытие -
+        доля ингредиентов рецепта из переданных. Сортировка по убыванию
+        покрытия, затем по числу недостающих и от новых рецептов к старым.
+
+        Массивы рецептов обходятся от коротких к длинным. Рецепт, которого
+        не было в предыдущих массивах, учитывается, только если ему еще
+        может хватить переданных ингредиентов. В длинных массивах, где
+        кандидатов мало, их наличие проверяется бинарным поиском.
+        """
+        with self._lock:
+            self._refresh()
+            postings = sorted(
+                (
+                    self._postings.get(ingredient_id, array("i"))
+                    for ingredient_id in set(ingredient_ids)
+                ),
+                key=len,
+            )
+            sizes = self._sizes
+            matched = Counter()
+            for position, ingredient_recipes in enumerate(postings):
+                # Рецепт, впервые встреченный в этом массиве, содержит не
+                # больше len(postings) - position переданных ингредиентов
+                limit = len(postings) - position + max_missing
+                small = [
+                    recipe_ids
+                    for size, recipe_ids in self._by_size.items()
+                    if size <= limit
+                ]
+                probes = len(matched) + sum(map(len, small))
+                if probing_is_cheaper(probes, ingredient_recipes):
+                    candidates = set(matched).union(*small)
+                    for recipe_id in candidates:
+                        if contains(ingredient_recipes, recipe_id):
+                            matched[recipe_id] += 1
+                    continue
+                for recipe_id in ingredient_recipes:
+                    if recipe_id in matched or sizes[recipe_id] <= limit:
+                        matched[recipe_id] += 1
+
+            results = []
+            for recipe_id, have in matched.items():
+                missing = sizes[recipe_id] - have
+                if missing <= max_missing:
+                    results.append(
+                        (recipe_id, have / sizes[recipe_id], missing)
+                    )
+
+        results.sort(key=lambda result: (-result[1], result[2], -result[0]))
+        return results
+
+
+recipe_index = RecipeIngredientIndex()
@@ -1,21 +1,30 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import exceptions, serializers
+from PIL import Image
 from rest_framework.authtoken.models import Token
 
+from api import recipe_index
+from api.exceptions import PayloadTooLarge
+from api.metrics import IMAGE_DECODE_BYTES
 from api.validators import UsernameValidator
+from recipes import feed, images
 from recipes.models import (
-    Favorite,
     Ingredient,
     IngredientRecipe,
     Recipe,
     ShoppingCart,
     Tag,
 )
+from recipes.signals import defer_recipe_updates
 from users.models import Follow, User
 
 
@@ -49,6 +58,8 @@ class ProfileSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Подписан ли на пользователя"""
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context.get("request").user
         if user.is_authenticated:
             return user.follower.filter(author=obj).exists()
@@ -107,17 +118,96 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Поле сериализатора Base64 кодировка изображения"""
+    """
+    Поле сериализатора Base64 кодировка изображения
+
+    Base64 декодируется частями во временный файл, который держится в
+    памяти до spool_max_size байт и затем сбрасывается на диск. Размер
+    проверяется по уже записанным байтам, и декодирование прерывается
+    при превышении, число пикселей - по заголовку изображения до его
+    полной загрузки.
+    """
+
+    chunk_size = 64 * 1024
+    spool_max_size = 1024 * 1024
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+            data = self.decode(data)
 
         return super().to_internal_value(data)
 
+    def too_large(self, message):
+        """Ошибка 413 с привязкой к полю"""
+        return PayloadTooLarge({self.field_name: [message]})
+
+    def decode(self, data):
+        """Потоковое декодирование data URL во временный файл"""
+        header_end = data.find(";base64,")
+        if header_end == -1:
+            raise serializers.ValidationError("Некорректный формат base64.")
+
+        ext = data[:header_end].split("/")[-1]
+        start = header_end + len(";base64,")
+        file = SpooledTemporaryFile(max_size=self.spool_max_size)
+        try:
+            for chunk in self.iter_groups(data, start):
+                file.write(base64.b64decode(chunk, validate=True))
+                if file.tell() > settings.IMAGE_UPLOAD_MAX_BYTES:
+                    file.close()
+                    raise self.too_large(
+                        "Размер изображения превышает "
+                        f"{settings.IMAGE_UPLOAD_MAX_BYTES} байт."
+                    )
+        except binascii.Error:
+            file.close()
+            raise serializers.ValidationError("Некорректный формат base64.")
+
+        self.check_pixels(file)
+        upload = File(file, name="temp." + ext)
+        upload.size = file.tell()
+        IMAGE_DECODE_BYTES.observe(upload.size)
+        file.seek(0)
+        return upload
+
+    def iter_groups(self, data, start):
+        """
+        Части base64 по chunk_size символов без пробельных символов.
+
+        Каждая часть содержит целое число групп по 4 символа, остаток
+        переносится в следующую часть, поэтому переносы строк в данных
+        в стиле MIME не сдвигают границы групп.
+        """
+        rest = ""
+        for begin in range(start, len(data), self.chunk_size):
+            end = begin + self.chunk_size
+            chunk = rest + "".join(data[begin:end].split())
+            size = len(chunk) - len(chunk) % 4
+            rest = chunk[size:]
+            yield chunk[:size]
+        if rest:
+            raise binascii.Error("Неполная группа base64")
+
+    def check_pixels(self, file):
+        """Проверка числа пикселей по заголовку изображения"""
+        size = file.tell()
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            width, height = settings.IMAGE_UPLOAD_MAX_PIXELS + 1, 1
+        except Exception:
+            # Некорректное изображение отклонит проверка ImageField
+            width, height = 0, 0
+        file.seek(size)
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            file.close()
+            raise self.too_large(
+                "Изображение больше "
+                f"{settings.IMAGE_UPLOAD_MAX_PIXELS} пикселей."
+            )
+
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
     """Сериалайзер промежуточной таблицы рецепта и ингридиентов"""
@@ -136,7 +226,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 class RecipesGETSerializer(serializers.ModelSerializer):
     """GET Сериалайзер рецептов"""
 
-    image = Base64ImageField(required=True, use_url=False)
+    image = serializers.SerializerMethodField()
     ingredients = IngredientRecipeSerializer(
         many=True, source="recipe_ingredient.all"
     )
@@ -165,8 +255,17 @@ class RecipesGETSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
         )
 
+    def get_image(self, obj):
+        """Полное изображение для рецепта, карточка для списков"""
+        view = self.context.get("view")
+        if view is not None and view.action == "retrieve":
+            return obj.get_image("full")
+        return obj.get_image("card")
+
     def get_is_in_shopping_cart(self, obj):
         """Находится ли в списке покупок"""
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         user = self.context.get("request").user
         if user.is_authenticated:
             return user.cart.filter(recipe=obj).exists()
@@ -174,6 +273,8 @@ class RecipesGETSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Находится ли в списке избранного"""
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         user = self.context.get("request").user
         if user.is_authenticated:
             return user.favorite.filter(recipe=obj).exists()
@@ -181,11 +282,23 @@ class RecipesGETSerializer(serializers.ModelSerializer):
 
     def get_author(self, obj):
         """Передача контекста в сериализатор профиля"""
+        if hasattr(obj, "author_is_subscribed"):
+            obj.author.is_subscribed = obj.author_is_subscribed
         return ProfileSerializer(
             instance=obj.author, read_only=True, context=self.context
         ).data
 
 
+class RecipeCoverageSerializer(RecipesGETSerializer):
+    """Рецепт с долей имеющихся ингредиентов и числом недостающих"""
+
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipesGETSerializer.Meta):
+        fields = RecipesGETSerializer.Meta.fields + ("coverage", "missing")
+
+
 class RecipesSerializer(serializers.ModelSerializer):
     """Сериалайзер рецептов"""
 
@@ -218,27 +331,26 @@ class RecipesSerializer(serializers.ModelSerializer):
         }
 
     def validate_ingredients(self, value):
-        """Валидация ингрeдиентов"""
+        """Валидация ингрeдиентов и подстановка объектов одним запросом"""
+        if len(value) == 0:
+            raise serializers.ValidationError(
+                "Нельзя сохранить рецепт без ингредиентов!"
+            )
+
         ingredients_ids = [val.get("ingredient").get("id") for val in value]
-        if (
-            max(list(map(lambda x: ingredients_ids.count(x), ingredients_ids)))
-            > 1
-        ):
+        if len(set(ingredients_ids)) < len(ingredients_ids):
             raise serializers.ValidationError(
                 "Повторяющиеся ингредиенты недопустимы!"
             )
-        if len(value) == 0:
+
+        ingredients = Ingredient.objects.in_bulk(ingredients_ids)
+        if len(ingredients) < len(ingredients_ids):
             raise serializers.ValidationError(
-                "Нельзя сохранить рецепт без ингредиентов!"
+                "Передан несуществующий ингредиент!"
             )
 
         for val in value:
-            if not Ingredient.objects.filter(
-                pk=val.get("ingredient").get("id")
-            ).exists():
-                raise serializers.ValidationError(
-                    "Передан несуществующий ингредиент!"
-                )
+            val["ingredient"] = ingredients[val.get("ingredient").get("id")]
 
         return value
 
@@ -248,9 +360,7 @@ class RecipesSerializer(serializers.ModelSerializer):
             [
                 IngredientRecipe(
                     recipe=recipe,
-                    ingredient=get_object_or_404(
-                        Ingredient, pk=elem.get("ingredient").get("id")
-                    ),
+                    ingredient=elem.get("ingredient"),
                     amount=elem.get("amount"),
                 )
                 for elem in ingredients.get("all")
@@ -261,34 +371,99 @@ class RecipesSerializer(serializers.ModelSerializer):
         """Создание нового рецепта"""
         ingredients = validated_data.pop("recipe_ingredient")
         tags = validated_data.pop("tags")
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.ingredient_recipe_bulk_create(
-            recipe=recipe, ingredients=ingredients
-        )
+        with defer_recipe_updates():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.ingredient_recipe_bulk_create(
+                recipe=recipe, ingredients=ingredients
+            )
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        recipe_index.schedule_refresh(recipe.pk)
+        images.schedule(recipe)
+        feed.schedule_fan_out(recipe)
         return recipe
 
+    def ingredient_recipe_update(self, recipe, ingredients):
+        """
+        Обновление связи ингредиентов с рецептом по разнице с текущими.
+
+        Изменившиеся количества обновляются, новые ингредиенты создаются,
+        отсутствующие в запросе удаляются одним запросом.
+        """
+        existing = {}
+        removed = []
+        for row in recipe.recipe_ingredient.all():
+            if row.ingredient_id in existing:
+                removed.append(row.pk)
+            else:
+                existing[row.ingredient_id] = row
+
+        created = []
+        changed = []
+        for elem in ingredients.get("all"):
+            ingredient = elem.get("ingredient")
+            amount = elem.get("amount")
+            row = existing.pop(ingredient.pk, None)
+            if row is None:
+                created.append(
+                    IngredientRecipe(
+                        recipe=recipe, ingredient=ingredient, amount=amount
+                    )
+                )
+            elif row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+
+        removed.extend(row.pk for row in existing.values())
+        if removed:
+            IngredientRecipe.objects.filter(pk__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ["amount"])
+        if created:
+            IngredientRecipe.objects.bulk_create(created)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновление существующего рецепта"""
-        ingredients = validated_data.pop("recipe_ingredient")
-        tags = validated_data.pop("tags")
-
-        instance.image = validated_data.get("image", instance.image)
-        instance.name = validated_data.get("name", instance.name)
-        instance.text = validated_data.get("text", instance.text)
-        instance.cooking_time = validated_data.get(
-            "cooking_time", instance.cooking_time
-        )
-        instance.recipe_ingredient.all().delete()
-        instance.tags.set(tags)
-        instance.save()
-        self.ingredient_recipe_bulk_create(
-            recipe=instance, ingredients=ingredients
-        )
+        """Обновление существующего рецепта, в том числе частичное"""
+        ingredients = validated_data.pop("recipe_ingredient", None)
+        tags = validated_data.pop("tags", None)
+
+        update_fields = [
+            field
+            for field in ("image", "name", "text", "cooking_time")
+            if field in validated_data
+            and (
+                field == "image"
+                or getattr(instance, field) != validated_data[field]
+            )
+        ]
+        for field in update_fields:
+            setattr(instance, field, validated_data[field])
+
+        with defer_recipe_updates():
+            if update_fields:
+                instance.save(update_fields=update_fields)
+            if "image" in update_fields:
+                images.schedule(instance)
+            if tags is not None:
+                instance.tags.set(tags)
+            if ingredients is not None:
+                self.ingredient_recipe_update(
+                    recipe=instance, ingredients=ingredients
+                )
+        if ingredients is not None or {"name", "text"} & set(update_fields):
+            Recipe.objects.filter(pk=instance.pk).update_search_vector()
+        if ingredients is not None:
+            recipe_index.schedule_refresh(instance.pk)
         return instance
 
     def to_representation(self, instance):
         """Представление объекта после создания/изменения"""
+        instance = (
+            Recipe.objects.with_related()
+            .with_user_flags(self.context["request"].user)
+            .get(pk=instance.pk)
+        )
         representation = RecipesGETSerializer(
             instance=instance, context=self.context
         )
@@ -298,58 +473,29 @@ class RecipesSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Короткий сериалайзер рецепта"""
 
-    image = Base64ImageField(read_only=True, use_url=False)
+    image = serializers.SerializerMethodField()
 
     class Meta:
         fields = ("id", "name", "image", "cooking_time")
         read_only_fields = ("id", "name", "image", "cooking_time")
         model = Recipe
 
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериалайзер избранного"""
-
-    class Meta:
-        fields = (
-            "id",
-            "user",
-            "recipe",
-        )
-        write_only_fields = (
-            "user",
-            "recipe",
-        )
-        model = Favorite
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=model.objects.all(),
-                fields=("user", "recipe"),
-                message="Вы уже добавили этот рецепт",
-            ),
-        ]
+    def get_image(self, obj):
+        """Миниатюра изображения рецепта"""
+        return obj.get_image("thumbnail")
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериалайзер списка покупок"""
+    """
+    Параметры добавления рецепта в список покупок.
+
+    Пользователь и рецепт берутся из запроса, повторное добавление
+    определяется самой вставкой, а не запросом уникальности.
+    """
 
     class Meta:
-        fields = (
-            "id",
-            "user",
-            "recipe",
-        )
-        write_only_fields = (
-            "user",
-            "recipe",
-        )
+        fields = ("portions",)
         model = ShoppingCart
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=model.objects.all(),
-                fields=("user", "recipe"),
-                message="Вы уже добавили этот рецепт",
-            ),
-        ]
 
 
 class ProfileGetSerializer(serializers.ModelSerializer):
@@ -384,10 +530,14 @@ class ProfileGetSerializer(serializers.ModelSerializer):
 
     def get_recipes_count(self, obj):
         """Кол-во рецептов пользователя"""
+        if hasattr(obj, "recipes_count"):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_is_subscribed(self, obj):
         """Подписан ли на пользователя"""
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context["request"].user
         if user.is_authenticated:
             return user.follower.filter(author=obj).exists()
@@ -470,3 +620,13 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             )
 
         return data
+
+
+class BatchSerializer(serializers.Serializer):
+    """Список id для пакетного добавления или удаления"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE,
+    )
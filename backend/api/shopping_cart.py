@@ -0,0 +1,227 @@
+import csv
+import json
+from collections import deque
+
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.http import HttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from api.metrics import observe_export
+from recipes.models import IngredientRecipe, ShoppingCart
+
+
+class Echo:
+    """Псевдо-буфер: возвращает записанную строку вместо хранения"""
+
+    def write(self, value):
+        return value
+
+
+class ExportFormatNegotiation(DefaultContentNegotiation):
+    """
+    Согласование контента, не учитывающее параметр format.
+
+    В выгрузке списка покупок format выбирает формат файла, а не рендерер.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+# Ребра графа единиц измерения: (единица, единица, сколько второй в первой)
+UNIT_EDGES = (
+    ("кг", "г", 1000),
+    ("мг", "г", 0.001),
+    ("л", "мл", 1000),
+    ("стакан", "мл", 250),
+    ("ст. л.", "мл", 15),
+    ("ч. л.", "мл", 5),
+)
+
+# Единицы выгрузки для больших количеств в базовых единицах
+DISPLAY_UNITS = {
+    "г": ("кг", 1000),
+    "мл": ("л", 1000),
+}
+
+
+def build_unit_table(edges):
+    """
+    Базовая единица и множитель перевода в нее для каждой единицы графа.
+
+    Базовой в каждой компоненте связности становится единица, первой
+    встретившаяся вторым концом ребра, остальные приводятся к ней обходом
+    графа в ширину.
+    """
+    graph = {}
+    for unit, other, factor in edges:
+        graph.setdefault(unit, []).append((other, factor))
+        graph.setdefault(other, []).append((unit, 1 / factor))
+
+    table = {}
+    for _, base, _ in edges:
+        if base in table:
+            continue
+        table[base] = (base, 1)
+        queue = deque([base])
+        while queue:
+            unit = queue.popleft()
+            for other, factor in graph[unit]:
+                if other not in table:
+                    # 1 unit = factor other, значит 1 other равен
+                    # множителю unit, деленному на factor
+                    table[other] = (base, table[unit][1] / factor)
+                    queue.append(other)
+    return table
+
+
+UNITS = build_unit_table(UNIT_EDGES)
+
+
+def get_shopping_list(user):
+    """
+    Суммарное количество ингредиентов из списка покупок пользователя.
+
+    Количество умножается на число порций рецепта в списке и переводится
+    в базовую единицу одним запросом с группировкой по названию и
+    единице, поэтому г и кг одного ингредиента складываются.
+    """
+    unit_field = "ingredient__measurement_unit"
+    return (
+        IngredientRecipe.objects.filter(recipe__cart__user=user)
+        .annotate(
+            unit=Case(
+                *(
+                    When(**{unit_field: unit}, then=Value(base))
+                    for unit, (base, _) in UNITS.items()
+                ),
+                default=F(unit_field),
+            ),
+            factor=Case(
+                *(
+                    When(**{unit_field: unit}, then=Value(factor))
+                    for unit, (_, factor) in UNITS.items()
+                ),
+                default=Value(1.0),
+                output_field=FloatField(),
+            ),
+        )
+        .values("ingredient__name", "unit")
+        .annotate(
+            amount=Sum(
+                F("amount") * F("factor") * F("recipe__cart__portions"),
+                output_field=FloatField(),
+            )
+        )
+        .order_by("ingredient__name", "unit")
+    )
+
+
+def get_cart_recipes(user):
+    """Рецепты из списка покупок с числом порций"""
+    return (
+        ShoppingCart.objects.filter(user=user)
+        .values("recipe_id", "recipe__name", "portions")
+        .order_by("recipe__name")
+    )
+
+
+def format_amount(amount):
+    """Целое количество без дробной части, остальные - до сотых"""
+    amount = round(amount, 2)
+    return int(amount) if amount == int(amount) else amount
+
+
+def make_shopping_list(rows, recipes):
+    """
+    Структура списка покупок из сгруппированных строк get_shopping_list
+    и рецептов get_cart_recipes, из нее строятся все форматы выгрузки.
+    """
+    items = []
+    for row in rows:
+        unit, amount = row["unit"], row["amount"]
+        display_unit, factor = DISPLAY_UNITS.get(unit, (unit, 1))
+        if amount >= factor:
+            unit, amount = display_unit, amount / factor
+        items.append(
+            {
+                "name": row["ingredient__name"],
+                "measurement_unit": unit,
+                "amount": format_amount(amount),
+            }
+        )
+    return {
+        "recipes": [
+            {
+                "id": recipe["recipe_id"],
+                "name": recipe["recipe__name"],
+                "portions": recipe["portions"],
+            }
+            for recipe in recipes
+        ],
+        "items": items,
+    }
+
+
+def build_shopping_list(user):
+    """Структура списка покупок пользователя"""
+    return make_shopping_list(get_shopping_list(user), get_cart_recipes(user))
+
+
+def render_txt(shopping_list):
+    """Построчная выгрузка в текстовом формате"""
+    for item in shopping_list["items"]:
+        yield (
+            f"{item['name']}({item['measurement_unit']}) - {item['amount']}\n"
+        )
+
+
+def render_csv(shopping_list):
+    """Построчная выгрузка в формате csv"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for item in shopping_list["items"]:
+        yield writer.writerow(
+            (item["name"], item["measurement_unit"], item["amount"])
+        )
+
+
+def render_json(shopping_list):
+    """Выгрузка структуры списка покупок в формате json"""
+    yield json.dumps(shopping_list, ensure_ascii=False)
+
+
+EXPORT_FORMATS = {
+    "txt": ("text/plain; charset=utf-8", render_txt),
+    "csv": ("text/csv; charset=utf-8", render_csv),
+    "json": ("application/json", render_json),
+}
+
+
+def get_export_format(request):
+    """Формат выгрузки из параметра format, по умолчанию txt"""
+    export_format = request.query_params.get("format", "txt")
+    if export_format not in EXPORT_FORMATS:
+        raise ValidationError(
+            {"format": f"Доступные форматы: {', '.join(EXPORT_FORMATS)}"}
+        )
+    return export_format
+
+
+def make_export_response(export_format, shopping_list):
+    """
+    Ответ с файлом списка покупок.
+
+    Список сгруппирован по ингредиентам и невелик, поэтому строится
+    целиком и отдается обычным ответом.
+    """
+    content_type, render = EXPORT_FORMATS[export_format]
+    response = HttpResponse(
+        "".join(observe_export(export_format, render(shopping_list))),
+        content_type=content_type,
+    )
+    response[
+        "Content-Disposition"
+    ] = f'attachment; filename="Список_покупок.{export_format}"'
+    return response
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.cache import bump_cache_version
+from api.recipe_index import schedule_refresh
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.signals import recipe_updates_deferred
+from users.models import User
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    """Сброс кэша тегов при их изменении"""
+    bump_cache_version("tags")
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    """Сброс кэша и поискового индекса ингредиентов при их изменении"""
+    bump_cache_version("ingredients")
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def refresh_recipe_index(sender, instance, **kwargs):
+    """
+    Обновление индекса ингредиентов рецептов при изменении состава.
+
+    Изменения в API обновляют индекс явно, каскадное удаление рецепта
+    учитывается сигналом удаления рецепта.
+    """
+    if recipe_updates_deferred.get():
+        return
+    if not isinstance(kwargs.get("origin"), Recipe):
+        schedule_refresh(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_recipe_index(sender, instance, **kwargs):
+    """Удаление рецепта из индекса ингредиентов рецептов"""
+    schedule_refresh(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Сброс кэша удаленного токена, например при выходе"""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Сброс кэша токенов пользователя при изменении, например пароля"""
+    if not created:
+        token_cache.invalidate_user(instance.pk)
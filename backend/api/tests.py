@@ -0,0 +1,878 @@
+import base64
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from threading import Barrier
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api import async_views, batch
+from api import urls as api_urls
+from api.authentication import token_cache
+from api.exceptions import PayloadTooLarge
+from api.recipe_index import RecipeIngredientIndex, mark_changed
+from api.serializers import Base64ImageField, RecipesGETSerializer
+from api.views import IngredientViewSet, RecipeViewSet
+from foodgram import urls as foodgram_urls
+from recipes import feed, images
+from recipes.models import (
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    RecipeQuerySet,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Follow, User
+
+
+def create_user(username):
+    """Пользователь для тестов"""
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        first_name=username,
+        last_name=username,
+        password="password",
+    )
+
+
+def create_recipe(author, ingredients=(), name="Рецепт"):
+    """Рецепт автора с ингредиентами по одной единице"""
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text="Описание",
+        cooking_time=10,
+        image="media/recipes/test.png",
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+class UserRecipeConcurrencyTest(TransactionTestCase):
+    """
+    Параллельные добавления и удаления одной пары пользователь - рецепт.
+
+    Ровно один запрос меняет связь, остальные получают 400 без
+    IntegrityError, счетчик рецепта совпадает с пересчетом по связям.
+    """
+
+    workers = 8
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            raise ImproperlyConfigured(
+                "Параллельным запросам нужна тестовая БД SQLite в файле, "
+                "задайте DB_TEST_NAME"
+            )
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = create_user("user")
+        self.recipe = create_recipe(create_user("author"))
+
+    def request_in_parallel(self, method, url, data=None):
+        """Одновременные запросы из отдельных потоков и соединений"""
+        barrier = Barrier(self.workers)
+
+        def send(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return getattr(client, method)(url, data, format="json")
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(send, range(self.workers)))
+
+    def assert_counter(self, model):
+        """Счетчик рецепта совпадает с пересчетом по связям"""
+        self.recipe.refresh_from_db()
+        stored = getattr(self.recipe, model.counter_field)
+        Recipe.objects.filter(pk=self.recipe.pk).recount()
+        self.recipe.refresh_from_db()
+        self.assertEqual(stored, getattr(self.recipe, model.counter_field))
+
+    def assert_toggle(self, url, model, data=None):
+        expected_count = {
+            "post": (status.HTTP_201_CREATED, 1),
+            "delete": (status.HTTP_204_NO_CONTENT, 0),
+        }
+        for method, (code, count) in expected_count.items():
+            with self.subTest(method=method):
+                codes = sorted(
+                    response.status_code
+                    for response in self.request_in_parallel(method, url, data)
+                )
+                self.assertEqual(codes.count(code), 1, codes)
+                self.assertEqual(
+                    codes.count(status.HTTP_400_BAD_REQUEST),
+                    self.workers - 1,
+                    codes,
+                )
+                self.assertEqual(model.objects.count(), count)
+                self.assert_counter(model)
+
+    def test_favorite(self):
+        self.assert_toggle(
+            f"/api/recipes/{self.recipe.pk}/favorite/", Favorite
+        )
+
+    def test_shopping_cart(self):
+        self.assert_toggle(
+            f"/api/recipes/{self.recipe.pk}/shopping_cart/",
+            ShoppingCart,
+            {"portions": 2},
+        )
+
+    def test_batch(self):
+        """Пакетный запрос учитывает только связи, измененные им самим"""
+        for url, model in (
+            ("/api/recipes/favorite/", Favorite),
+            ("/api/recipes/shopping_cart/", ShoppingCart),
+        ):
+            for method, done, skipped in (
+                ("post", batch.CREATED, batch.EXISTS),
+                ("delete", batch.DELETED, batch.NOT_LINKED),
+            ):
+                with self.subTest(url=url, method=method):
+                    statuses = sorted(
+                        response.data["results"][0]["status"]
+                        for response in self.request_in_parallel(
+                            method, url, {"ids": [self.recipe.pk]}
+                        )
+                    )
+                    self.assertEqual(
+                        statuses,
+                        sorted([done] + [skipped] * (self.workers - 1)),
+                    )
+                    self.assert_counter(model)
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы"""
+
+    page_sizes = (6, 50, 200)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        author = create_user("author")
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"Тег {number}", color="#000000", slug=f"tag{number}")
+            for number in range(2)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(3)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f"Рецепт {number}",
+                text="Описание",
+                cooking_time=10,
+                image="media/recipes/test.png",
+            )
+            for number in range(max(cls.page_sizes) + 1)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in tags
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes
+            for ingredient in ingredients
+        )
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def assert_list_queries(self, client, queries, before_request=None):
+        for page_size in self.page_sizes:
+            with self.subTest(page_size=page_size):
+                if before_request is not None:
+                    before_request()
+                with self.assertNumQueries(queries):
+                    response = client.get(f"/api/recipes/?limit={page_size}")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_authenticated(self):
+        """Токен, COUNT, рецепты с флагами, теги и ингредиенты"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assert_list_queries(
+            client, 5, lambda: token_cache.delete(self.token.key)
+        )
+
+    def test_anonymous(self):
+        """COUNT, рецепты, теги и ингредиенты"""
+        self.assert_list_queries(APIClient(), 4)
+
+
+@override_settings(TOKEN_CACHE_TIMEOUT=300)
+class TokenCacheTest(TestCase):
+    """Кэш аутентификации по токену"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def get_me(self):
+        return self.client.get("/api/users/me/")
+
+    def test_hit_without_token_query(self):
+        """Попадание не читает токен, профиль догружается из БД"""
+        with CaptureQueriesContext(connection) as miss:
+            self.assertEqual(self.get_me().status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as hit:
+            response = self.get_me()
+        self.assertEqual(response.data["username"], "user")
+        self.assertFalse(
+            any("authtoken_token" in query["sql"] for query in hit)
+        )
+        self.assertTrue(
+            any("authtoken_token" in query["sql"] for query in miss)
+        )
+
+    def test_entry_without_user_data(self):
+        """В кэше только id, is_active и версия пользователя"""
+        self.get_me()
+        self.assertEqual(
+            cache.get(token_cache.get_cache_key(self.token.key)),
+            (self.user.pk, True, token_cache.get_version(self.user.pk)),
+        )
+
+    def test_logout(self):
+        self.get_me()
+        response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.get_me().status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_user_change(self):
+        """Сохранение пользователя сбрасывает записи его токенов"""
+        self.get_me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(
+            self.get_me().status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_set_password(self):
+        """Смена пароля пользователем из кэша"""
+        self.get_me()
+        response = self.client.post(
+            "/api/users/set_password/",
+            {"current_password": "password", "new_password": "new-password"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("new-password"))
+        self.assertEqual(self.user.username, "user")
+        self.assertNotEqual(
+            cache.get(token_cache.get_cache_key(self.token.key))[2],
+            token_cache.get_version(self.user.pk),
+        )
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.get_me()
+        self.assertIsNone(cache.get(token_cache.get_cache_key(self.token.key)))
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """Keyset-пагинация списка рецептов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user("author")
+        cls.recipes = [
+            create_recipe(author, name=f"Рецепт {number}")
+            for number in range(3)
+        ]
+
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [recipe["id"] for recipe in response.data["results"]]
+
+    def test_empty_reverse_page_keeps_cursor(self):
+        """Пустая страница назад ведет вперед на первую страницу"""
+        newest = self.recipes[-1]
+        cursor = base64.urlsafe_b64encode(
+            f"{newest.created.isoformat()}|{newest.pk}|p".encode()
+        ).decode()
+        response, ids = self.get_ids(f"/api/recipes/?limit=2&cursor={cursor}")
+        self.assertEqual(ids, [])
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+        response, ids = self.get_ids(response.data["next"])
+        self.assertEqual(ids, [self.recipes[2].pk, self.recipes[1].pk])
+        self.assertIn("cursor=", response.data["next"])
+
+
+def reload_urls():
+    """Перестроить адреса API по текущему значению ASYNC_VIEWS"""
+    importlib.reload(api_urls)
+    importlib.reload(foodgram_urls)
+    clear_url_caches()
+
+
+class AsyncViewsTest(TestCase):
+    """Асинхронные представления режима SERVER_MODE=asgi"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.async_views = override_settings(ASYNC_VIEWS=True)
+        cls.async_views.enable()
+        reload_urls()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.async_views.disable()
+        reload_urls()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tag = Tag.objects.create(name="Тег", color="#000000", slug="tag")
+        cls.ingredients = Ingredient.objects.bulk_create(
+            [
+                Ingredient(name="Соль", measurement_unit="г"),
+                Ingredient(name="Морская соль", measurement_unit="г"),
+                Ingredient(name="Сахар", measurement_unit="г"),
+            ]
+        )
+        cls.recipe = create_recipe(cls.user, cls.ingredients[:1])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+        self.headers = {"Authorization": f"Token {self.token.key}"}
+
+    async def test_tags(self):
+        self.assertIs(resolve("/api/tags/").func, async_views.tag_list)
+        response = await self.client.get("/api/tags/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            [
+                {
+                    "id": self.tag.pk,
+                    "name": "Тег",
+                    "color": "#000000",
+                    "slug": "tag",
+                }
+            ],
+        )
+        self.assertIn("ETag", response)
+
+    async def test_ingredient_search(self):
+        """Сначала начало названия, затем вхождение"""
+        response = await self.client.get("/api/ingredients/?name=соль")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["name"] for item in json.loads(response.content)],
+            ["Соль", "Морская соль"],
+        )
+
+    async def test_recipe_detail(self):
+        response = await self.client.get(
+            f"/api/recipes/{self.recipe.pk}/", headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data["id"], self.recipe.pk)
+        self.assertTrue(data["is_in_shopping_cart"])
+
+        response = await self.client.get("/api/recipes/0/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_download(self):
+        for export_format, content_type, content in (
+            ("txt", "text/plain; charset=utf-8", "Соль(г) - 1\n"),
+            (
+                "json",
+                "application/json",
+                json.dumps(
+                    {
+                        "recipes": [
+                            {
+                                "id": self.recipe.pk,
+                                "name": "Рецепт",
+                                "portions": 1,
+                            }
+                        ],
+                        "items": [
+                            {
+                                "name": "Соль",
+                                "measurement_unit": "г",
+                                "amount": 1,
+                            }
+                        ],
+                    },
+                    ensure_ascii=False,
+                ),
+            ),
+        ):
+            with self.subTest(export_format=export_format):
+                response = await self.client.get(
+                    "/api/recipes/download_shopping_cart/"
+                    f"?format={export_format}",
+                    headers=self.headers,
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response["Content-Type"], content_type)
+                self.assertEqual(response.content.decode(), content)
+
+        response = await self.client.get(
+            "/api/recipes/download_shopping_cart/?format=pdf",
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_unauthorized(self):
+        """Без токена и с неверным токеном - 401 как у вьюсетов"""
+        for headers in ({}, {"Authorization": "Token wrong"}):
+            for url in (
+                "/api/recipes/download_shopping_cart/",
+                f"/api/recipes/{self.recipe.pk}/",
+            ):
+                with self.subTest(headers=headers, url=url):
+                    response = await self.client.get(url, headers=headers)
+                    if not headers and url.endswith(f"{self.recipe.pk}/"):
+                        self.assertEqual(
+                            response.status_code, status.HTTP_200_OK
+                        )
+                        continue
+                    self.assertEqual(
+                        response.status_code, status.HTTP_401_UNAUTHORIZED
+                    )
+                    self.assertEqual(response["WWW-Authenticate"], "Token")
+                    self.assertIn("detail", json.loads(response.content))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeWriteTest(TestCase):
+    """Создание и изменение рецепта через API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("author")
+        cls.tag = Tag.objects.create(name="Тег", color="#000000", slug="tag")
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(60)
+        )
+        buffer = BytesIO()
+        Image.new("RGB", (1, 1)).save(buffer, "PNG")
+        cls.image = (
+            "data:image/png;base64,"
+            + base64.b64encode(buffer.getvalue()).decode()
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, ingredients):
+        response = self.client.post(
+            "/api/recipes/",
+            {
+                "tags": [self.tag.pk],
+                "ingredients": [
+                    {"id": ingredient.pk, "amount": 1}
+                    for ingredient in ingredients
+                ],
+                "name": "Рецепт",
+                "image": self.image,
+                "text": "Описание",
+                "cooking_time": 10,
+            },
+            format="json",
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.data
+        )
+        return response.data["id"]
+
+    def test_queries_do_not_depend_on_ingredients(self):
+        """Число запросов создания не зависит от числа ингредиентов"""
+        with CaptureQueriesContext(connection) as single:
+            self.create_recipe(self.ingredients[:1])
+        with self.assertNumQueries(len(single)):
+            self.create_recipe(self.ingredients)
+
+    def test_search_vector_updated_once(self):
+        """Поисковый вектор пересчитывается один раз за запись"""
+        changes = {
+            "create": None,
+            "name and ingredients": {
+                "name": "Новый рецепт",
+                "ingredients": [
+                    {"id": ingredient.pk, "amount": 2}
+                    for ingredient in self.ingredients[5:15]
+                ],
+            },
+            "cooking time": {"cooking_time": 20},
+        }
+        recipe_id = None
+        for change, data in changes.items():
+            with self.subTest(change=change), mock.patch.object(
+                RecipeQuerySet, "update_search_vector", autospec=True
+            ) as update_search_vector:
+                if data is None:
+                    recipe_id = self.create_recipe(self.ingredients[:10])
+                else:
+                    response = self.client.patch(
+                        f"/api/recipes/{recipe_id}/", data, format="json"
+                    )
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(
+                    update_search_vector.call_count,
+                    0 if change == "cooking time" else 1,
+                )
+
+    def test_feed_fan_out_after_commit(self):
+        """Раскладка в ленты ставится в фон после коммита, а не в запросе"""
+        follower = create_user("follower")
+        Follow.objects.create(user=follower, author=self.user)
+        with mock.patch.object(images.executor, "submit"), mock.patch.object(
+            feed.executor, "submit"
+        ) as submit, self.captureOnCommitCallbacks(execute=True):
+            recipe_id = self.create_recipe(self.ingredients[:1])
+            self.assertFalse(FeedEntry.objects.exists())
+            submit.assert_not_called()
+        submit.assert_called_once_with(feed.fan_out_in_background, recipe_id)
+
+        with mock.patch("recipes.feed.close_old_connections"):
+            feed.fan_out_in_background(recipe_id)
+        self.assertQuerysetEqual(
+            FeedEntry.objects.values_list("user", "recipe"),
+            [(follower.pk, recipe_id)],
+        )
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+class RequestMetricsTest(TestCase):
+    """Метрики запроса в заголовке Server-Timing"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipe(create_user("author"))
+
+    def test_queries_and_serializer_time(self):
+        """Учет запросов при соединении, открытом до первого запроса"""
+        connection.ensure_connection()
+        with self.assertLogs("api.middleware", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/recipes/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            f'desc="{len(queries)} queries"', response["Server-Timing"]
+        )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["queries"], len(queries))
+        self.assertGreater(record["serializer_ms"], 0)
+
+    def test_serializer_class_unchanged(self):
+        """Замер не подменяет класс сериализатора"""
+        serializers = []
+        get_serializer = RecipeViewSet.get_serializer
+
+        def collect_serializer(view, *args, **kwargs):
+            serializers.append(get_serializer(view, *args, **kwargs))
+            return serializers[-1]
+
+        with mock.patch.object(
+            RecipeViewSet, "get_serializer", collect_serializer
+        ), self.assertLogs("api.middleware", "INFO") as logs:
+            response = self.client.get(f"/api/recipes/{self.recipe.pk}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIs(type(serializers[0]), RecipesGETSerializer)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record["serializer_ms"], 0)
+
+
+class MetricsViewTest(TestCase):
+    """Доступ к метрикам Prometheus только по токену"""
+
+    url = "/api/metrics"
+
+    @override_settings(METRICS_TOKEN="")
+    def test_disabled_without_token(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required(self):
+        for authorization, code in (
+            (None, status.HTTP_403_FORBIDDEN),
+            ("Bearer wrong", status.HTTP_403_FORBIDDEN),
+            ("Bearer secret", status.HTTP_200_OK),
+        ):
+            with self.subTest(authorization=authorization):
+                headers = {}
+                if authorization is not None:
+                    headers["HTTP_AUTHORIZATION"] = authorization
+                response = self.client.get(self.url, **headers)
+                self.assertEqual(response.status_code, code)
+
+    def test_missing_multiprocess_dir(self):
+        """Процесс не через gunicorn создает каталог метрик сам"""
+        directory = Path(tempfile.mkdtemp()) / "prometheus"
+        result = subprocess.run(
+            [sys.executable, "manage.py", "check"],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(directory)},
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(directory.is_dir())
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Потоковое декодирование изображения в base64"""
+
+    def setUp(self):
+        buffer = BytesIO()
+        Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+        self.content = buffer.getvalue()
+        self.encoded = base64.b64encode(self.content).decode()
+
+    def decode(self, encoded):
+        field = Base64ImageField()
+        field.chunk_size = 10
+        return field.decode("data:image/png;base64," + encoded)
+
+    def test_line_wrapped(self):
+        """Перенос строк в стиле MIME не сдвигает группы по 4 символа"""
+        wrapped = "\r\n".join(
+            self.encoded[position : position + 7]
+            for position in range(0, len(self.encoded), 7)
+        )
+        for encoded in (self.encoded, wrapped, wrapped + "\n"):
+            with self.subTest(encoded=encoded[:20]):
+                self.assertEqual(self.decode(encoded).read(), self.content)
+
+    def test_size_limit(self):
+        """Лимит считается по декодированным байтам, а не по длине строки"""
+        wrapped = "\n".join(self.encoded)
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=len(self.content)):
+            self.assertEqual(self.decode(wrapped).read(), self.content)
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=len(self.content) - 1):
+            with self.assertRaises(PayloadTooLarge):
+                self.decode(self.encoded)
+
+    def test_invalid(self):
+        for encoded in (self.encoded[:-1], self.encoded[:8] + "!" * 4):
+            with self.subTest(encoded=encoded[-8:]):
+                with self.assertRaises(ValidationError):
+                    self.decode(encoded)
+
+
+class SubscribeBatchTest(TestCase):
+    """Пакетная подписка на авторов"""
+
+    def test_statuses(self):
+        user = create_user("user")
+        author = create_user("author")
+        recipe = create_recipe(author)
+        client = APIClient()
+        client.force_authenticate(user)
+        ids = [user.pk, author.pk, author.pk + 1000]
+        expected = {
+            "post": [batch.SELF, batch.CREATED, batch.NOT_FOUND],
+            "delete": [batch.SELF, batch.DELETED, batch.NOT_FOUND],
+        }
+        for method, statuses in expected.items():
+            with self.subTest(method=method):
+                response = getattr(client, method)(
+                    "/api/users/subscribe/", {"ids": ids}, format="json"
+                )
+                self.assertEqual(
+                    [result["status"] for result in response.data["results"]],
+                    statuses,
+                )
+                self.assertEqual(
+                    FeedEntry.objects.filter(
+                        user=user, recipe=recipe
+                    ).exists(),
+                    method == "post",
+                )
+
+
+class IngredientSearchTest(TestCase):
+    """Поиск ингредиентов по индексу в памяти"""
+
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit="г")
+            for name in ("Морская соль", "Сахар", "Соль")
+        )
+
+    def test_search(self):
+        """Сначала начало названия, затем вхождение"""
+        response = APIClient().get("/api/ingredients/?name=соль")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["name"] for item in json.loads(response.content)],
+            ["Соль", "Морская соль"],
+        )
+
+    def test_filter_queryset_returns_queryset(self):
+        view = IngredientViewSet(action_map={"get": "list"})
+        view.request = view.initialize_request(
+            APIRequestFactory().get("/api/ingredients/", {"name": "соль"})
+        )
+        self.assertIsInstance(
+            view.filter_queryset(view.get_queryset()), QuerySet
+        )
+
+
+class RecipeIngredientIndexTest(TestCase):
+    """Обратный индекс ингредиентов рецептов"""
+
+    def setUp(self):
+        cache.clear()
+        author = create_user("author")
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+            for number in range(3)
+        )
+        self.full = create_recipe(author, self.ingredients)
+        self.partial = create_recipe(author, self.ingredients[:1])
+
+    def test_match_and_changes(self):
+        index = RecipeIngredientIndex()
+        first, second, third = (item.pk for item in self.ingredients)
+        self.assertEqual(
+            index.match([first], max_missing=2),
+            [(self.partial.pk, 1.0, 0), (self.full.pk, 1 / 3, 2)],
+        )
+
+        IngredientRecipe.objects.create(
+            recipe=self.partial, ingredient=self.ingredients[1], amount=1
+        )
+        mark_changed(self.partial.pk)
+        self.assertEqual(
+            index.match([first, second], max_missing=1),
+            [(self.partial.pk, 1.0, 0), (self.full.pk, 2 / 3, 1)],
+        )
+        self.assertEqual(index.match([third], max_missing=0), [])
+
+    def test_match_equals_full_count(self):
+        """Отсечение и бинарный поиск не меняют результат подсчета"""
+        random = Random(0)
+        author = create_user("cook")
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Продукт {number}", measurement_unit="г")
+            for number in range(10)
+        )
+        recipes = [
+            create_recipe(author, random.sample(ingredients, size))
+            for size in (random.randint(1, 6) for _ in range(40))
+        ]
+        ingredient_ids = [ingredient.pk for ingredient in ingredients]
+
+        def expected(query, max_missing):
+            compositions = {}
+            for (
+                ingredient_id,
+                recipe_id,
+            ) in IngredientRecipe.objects.values_list(
+                "ingredient_id", "recipe_id"
+            ):
+                compositions.setdefault(recipe_id, set()).add(ingredient_id)
+            results = []
+            for recipe_id, composition in compositions.items():
+                have = len(composition & set(query))
+                missing = len(composition) - have
+                if have and missing <= max_missing:
+                    results.append(
+                        (recipe_id, have / len(composition), missing)
+                    )
+            return sorted(
+                results,
+                key=lambda result: (-result[1], result[2], -result[0]),
+            )
+
+        def check(index):
+            for probing in (True, False):
+                with mock.patch(
+                    "api.recipe_index.probing_is_cheaper",
+                    return_value=probing,
+                ):
+                    for _ in range(20):
+                        query = random.sample(
+                            ingredient_ids, random.randint(1, 8)
+                        )
+                        max_missing = random.randint(0, 3)
+                        self.assertEqual(
+                            index.match(query, max_missing),
+                            expected(query, max_missing),
+                        )
+
+        index = RecipeIngredientIndex()
+        check(index)
+        for recipe in random.sample(recipes, 10):
+            recipe.recipe_ingredient.all().delete()
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in random.sample(
+                    ingredients, random.randint(1, 6)
+                )
+            )
+            mark_changed(recipe.pk)
+        check(index)
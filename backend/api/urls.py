@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
 from users.views import DeleteTokenView, ObtainTokenView, UsersViewSet
 
+from . import async_views
+from .metrics import metrics_view
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
 
 app_name = "api"
@@ -14,8 +17,31 @@ router_v1.register(r"ingredients", IngredientViewSet, basename="ingredient")
 router_v1.register(r"recipes", RecipeViewSet, basename="recipes")
 
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_VIEWS:
+    urlpatterns += [
+        path("tags/", async_views.tag_list, name="tags-list"),
+        path(
+            "ingredients/",
+            async_views.ingredient_list,
+            name="ingredient-list",
+        ),
+        path(
+            "recipes/download_shopping_cart/",
+            async_views.download_shopping_cart,
+            name="recipes-download-shopping-cart",
+        ),
+        path(
+            "recipes/<int:pk>/",
+            async_views.recipe_detail,
+            name="recipes-detail",
+        ),
+    ]
+
+urlpatterns += [
     path("", include(router_v1.urls)),
     path("auth/token/login/", ObtainTokenView.as_view(), name="login"),
     path("auth/token/logout/", DeleteTokenView.as_view(), name="logout"),
+    path("metrics", metrics_view, name="metrics"),
 ]
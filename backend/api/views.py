@@ -1,36 +1,51 @@
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, generics, permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
-from api.filters import RecipeFilterSet, NameSearchFilter
+from api.batch import apply_batch
+from api.cache import CachedResponseMixin
+from api.filters import RecipeFilterSet
+from api.ingredient_index import ingredient_index
+from api.metrics import LatencyMetricsMixin
+from api.middleware import SerializerMetricsMixin, get_serializer_data
+from api.pagination import CustomPaginator, FeedPaginator, RecipePaginator
+from api.recipe_index import recipe_index
 from api.serializers import (
-    FavoriteSerializer,
     IngredientSerializer,
+    RecipeCoverageSerializer,
     RecipesGETSerializer,
     RecipeShortSerializer,
     RecipesSerializer,
     ShoppingCartSerializer,
     TagSerializer,
 )
+from api.shopping_cart import (
+    ExportFormatNegotiation,
+    build_shopping_list,
+    get_export_format,
+    make_export_response,
+)
+from recipes.feed import get_feed
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 
 
-class CustomPaginator(PageNumberPagination):
-    """Настройки пагинатора"""
-
-    page_size = 6
-    page_size_query_param = "limit"
+def recount_recipes(recipe_ids):
+    """Пересчет счетчиков рецептов после пакетного изменения связей"""
+    Recipe.objects.filter(pk__in=recipe_ids).recount()
 
 
 class TagViewSet(
-    generics.ListAPIView, generics.RetrieveAPIView, viewsets.GenericViewSet
+    CachedResponseMixin,
+    SerializerMetricsMixin,
+    generics.ListAPIView,
+    generics.RetrieveAPIView,
+    viewsets.GenericViewSet,
 ):
     """Получение списка и одиночного тега"""
 
+    cache_prefix = "tags"
     serializer_class = TagSerializer
     permission_classes = [
         permissions.AllowAny,
@@ -39,36 +54,55 @@ class TagViewSet(
 
 
 class IngredientViewSet(
-    generics.ListAPIView, generics.RetrieveAPIView, viewsets.GenericViewSet
+    CachedResponseMixin,
+    SerializerMetricsMixin,
+    generics.ListAPIView,
+    generics.RetrieveAPIView,
+    viewsets.GenericViewSet,
 ):
     """Получение списка и одиночного ингридиента"""
 
+    cache_prefix = "ingredients"
     serializer_class = IngredientSerializer
     permission_classes = [
         permissions.AllowAny,
     ]
-    filter_backends = (
-        DjangoFilterBackend,
-        NameSearchFilter,
-    )
-    search_fields = ("^name",)
     queryset = Ingredient.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию обслуживается индексом в памяти без БД"""
+        if "name" not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        return self.get_cached_response(request, self.search)
+
+    def search(self, request):
+        """Ответ поиска ингредиентов по названию"""
+        return Response(self.get_search_data(request.query_params["name"]))
+
+    def get_search_data(self, name):
+        """Данные ответа поиска ингредиентов по названию"""
+        return get_serializer_data(
+            self.get_serializer(ingredient_index.search(name), many=True)
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    LatencyMetricsMixin, SerializerMetricsMixin, viewsets.ModelViewSet
+):
     """CRDU для модели Recipe"""
 
     serializer_class = RecipesSerializer
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
     ]
-    queryset = Recipe.objects.all()
-    pagination_class = CustomPaginator
+    pagination_class = RecipePaginator
     filter_backends = (
         DjangoFilterBackend,
         filters.OrderingFilter,
     )
-    ordering_fields = ("created",)
+    ordering_fields = ("created", "favorites_count")
+    max_missing = 2
     filterset_class = RecipeFilterSet
     filterset_fields = (
         "author",
@@ -77,6 +111,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
         "is_in_shopping_cart",
     )
 
+    def get_queryset(self):
+        """Рецепты с аннотированными флагами пользователя и подгруженными
+        связями"""
+        return Recipe.objects.with_related().with_user_flags(self.request.user)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
@@ -92,6 +131,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Добавление пользователя совершившего запрос"""
         serializer.save(author=self.request.user)
 
+    def change_user_recipe(self, request, pk, model, **fields):
+        """
+        Добавление (POST) или удаление (DELETE) рецепта в избранном или
+        списке покупок одним запросом к связям. Коды ответов по
+        docs/openapi-schema.yml: 201 при добавлении, 204 при удалении,
+        повторное добавление и удаление отсутствующего рецепта - 400.
+        """
+        recipe = get_object_or_404(
+            Recipe.objects.defer("search_vector"), pk=pk
+        )
+        if request.method == "POST":
+            if not model.objects.add(request.user, recipe, **fields):
+                return Response(
+                    {"errors": "Вы уже добавили этот рецепт"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(
+                RecipeShortSerializer(instance=recipe).data,
+                status=status.HTTP_201_CREATED,
+            )
+
+        if not model.objects.remove(request.user, recipe):
+            return Response(
+                {"errors": "Этого рецепта нет в списке"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(
         detail=True,
         methods=["POST", "DELETE"],
@@ -102,23 +169,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk):
         """Добавление рецептов в избранное"""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        if request.method == "POST":
-            serializer = FavoriteSerializer(
-                data={"user": request.user.pk, "recipe": recipe.pk}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(RecipeShortSerializer(instance=recipe).data)
+        return self.change_user_recipe(request, pk, Favorite)
 
-        instance = get_object_or_404(
-            Favorite, recipe=recipe, user=request.user
+    @action(
+        detail=False,
+        methods=["POST", "DELETE"],
+        url_path="favorite",
+        url_name="favorite-batch",
+        permission_classes=[
+            permissions.IsAuthenticated,
+        ],
+    )
+    def favorite_batch(self, request):
+        """Добавление и удаление рецептов в избранном списком id"""
+        return apply_batch(
+            request,
+            Favorite,
+            "recipe",
+            Recipe.objects.all(),
+            on_created=recount_recipes,
+            on_deleted=recount_recipes,
         )
-        deleted = instance.delete()
-        if deleted:
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response(status=status.HTTP_400_BAD_REQUEST)
 
     @action(
         detail=True,
@@ -130,23 +201,108 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk):
         """Добавление в список покупок"""
-        recipe = get_object_or_404(Recipe, pk=pk)
+        fields = {}
         if request.method == "POST":
-            serializer = ShoppingCartSerializer(
-                data={"user": request.user.pk, "recipe": recipe.pk}
-            )
+            serializer = ShoppingCartSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(RecipeShortSerializer(instance=recipe).data)
+            fields = serializer.validated_data
+        return self.change_user_recipe(request, pk, ShoppingCart, **fields)
 
-        instance = get_object_or_404(
-            ShoppingCart, recipe=recipe, user=request.user
+    @action(
+        detail=False,
+        methods=["POST", "DELETE"],
+        url_path="shopping_cart",
+        url_name="shopping-cart-batch",
+        permission_classes=[
+            permissions.IsAuthenticated,
+        ],
+    )
+    def shopping_cart_batch(self, request):
+        """Добавление и удаление рецептов в списке покупок списком id"""
+        return apply_batch(
+            request,
+            ShoppingCart,
+            "recipe",
+            Recipe.objects.all(),
+            on_created=recount_recipes,
+            on_deleted=recount_recipes,
+        )
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path="feed",
+        permission_classes=[
+            permissions.IsAuthenticated,
+        ],
+        pagination_class=FeedPaginator,
+    )
+    def feed(self, request):
+        """Лента рецептов авторов из подписок пользователя"""
+        queryset = (
+            get_feed(request.user).with_related().with_user_flags(request.user)
         )
-        deleted = instance.delete()
-        if deleted:
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(get_serializer_data(serializer))
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path="what_to_cook",
+        permission_classes=[
+            permissions.AllowAny,
+        ],
+        pagination_class=CustomPaginator,
+    )
+    def what_to_cook(self, request):
+        """
+        Рецепты из имеющихся ингредиентов по убыванию покрытия.
 
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        Ингредиенты передаются параметром ingredients списком id через
+        запятую или повтором параметра, max_missing ограничивает число
+        недостающих ингредиентов рецепта.
+        """
+        try:
+            ingredient_ids = {
+                int(value)
+                for values in request.query_params.getlist("ingredients")
+                for value in values.split(",")
+                if value
+            }
+            max_missing = int(
+                request.query_params.get("max_missing", self.max_missing)
+            )
+        except ValueError:
+            return Response(
+                {"ingredients": "Ожидаются целые id ингредиентов"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not ingredient_ids or max_missing < 0:
+            return Response(
+                {"ingredients": "Укажите ингредиенты и max_missing >= 0"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        matches = self.paginate_queryset(
+            recipe_index.match(ingredient_ids, max_missing)
+        )
+        recipes = (
+            Recipe.objects.with_related()
+            .with_user_flags(request.user)
+            .in_bulk([recipe_id for recipe_id, _, _ in matches])
+        )
+        page = []
+        for recipe_id, coverage, missing in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = coverage
+                recipe.missing = missing
+                page.append(recipe)
+        serializer = RecipeCoverageSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(get_serializer_data(serializer))
 
     @action(
         detail=False,
@@ -155,31 +311,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[
             permissions.IsAuthenticated,
         ],
+        content_negotiation_class=ExportFormatNegotiation,
     )
     def download_shopping_cart(self, request):
         """Сгенерировать и отдать список покупок"""
-        recipes_qs = Recipe.objects.filter(
-            cart__user=request.user
-        ).prefetch_related("ingredients")
-        shopping_dict = {}
-        for recipe in recipes_qs:
-            for ingredient in recipe.ingredients.all():
-                current_dict_key = (
-                    f"{ingredient.name}({ingredient.measurement_unit})"
-                )
-                if current_dict_key not in shopping_dict.keys():
-                    shopping_dict[
-                        current_dict_key
-                    ] = ingredient.ingredient_recipe.get(recipe=recipe).amount
-                else:
-                    shopping_dict[
-                        current_dict_key
-                    ] += ingredient.ingredient_recipe.get(recipe=recipe).amount
-        content = "\n".join(
-            [f"{key} - {value}" for key, value in shopping_dict.items()]
+        return make_export_response(
+            get_export_format(request), build_shopping_list(request.user)
         )
-        response = HttpResponse(content, content_type="text/plain")
-        response[
-            "Content-Disposition"
-        ] = 'attachment; filename="Список_покупок.txt"'
-        return response
@@ -0,0 +1,124 @@
+"""
+Бэкенд PostgreSQL с пулом соединений внутри процесса.
+
+Соединение Django берется из пула при первом запросе к БД и возвращается
+в пул вместо закрытия, поэтому CONN_MAX_AGE должен быть равен 0. Пул общий
+для всех потоков процесса; после fork воркера создается новый пул.
+"""
+import os
+import threading
+from functools import partial
+
+from django.db import DatabaseError
+from django.db.backends.postgresql.base import (
+    DatabaseWrapper as PostgresDatabaseWrapper,
+)
+
+from api.metrics import DB_CONNECTIONS_OPENED, DB_POOL_CHECKOUTS
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений ограниченного размера"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+
+    def get(self, connect, check=None):
+        """
+        Свободное соединение из пула или новое, если свободных нет.
+
+        Ждет освобождения соединения не дольше timeout секунд.
+        check проверяет пригодность соединения, взятого из пула.
+        Возвращает соединение и признак того, что оно открыто заново.
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise DatabaseError(
+                f"Пул соединений исчерпан ({self.max_size}) "
+                f"за {self.timeout} с"
+            )
+        try:
+            while True:
+                with self.lock:
+                    connection = self.idle.pop() if self.idle else None
+                if connection is None:
+                    return connect(), True
+                if not connection.closed and (
+                    check is None or check(connection)
+                ):
+                    return connection, False
+                connection.close()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection):
+        """Возвращает соединение в пул, откатив незавершенную транзакцию"""
+        try:
+            if not connection.closed:
+                connection.rollback()
+                with self.lock:
+                    self.idle.append(connection)
+        except Exception:
+            connection.close()
+        finally:
+            self.slots.release()
+
+
+def get_pool(alias, max_size, timeout):
+    """Пул соединений текущего процесса для псевдонима БД"""
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(max_size, timeout)
+        return _pools[key]
+
+
+def is_usable(connection):
+    """Проверка соединения запросом SELECT 1"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception:
+        return False
+    return True
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """Обертка PostgreSQL, получающая соединения из пула"""
+
+    # connection_created отправляется при каждой выдаче из пула, новые
+    # соединения считаются в get_new_connection
+    pooled = True
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL", {})
+        return get_pool(
+            self.alias,
+            options.get("MAX_SIZE", 10),
+            options.get("TIMEOUT", 30),
+        )
+
+    def get_new_connection(self, conn_params):
+        connection, opened = self.pool.get(
+            partial(super().get_new_connection, conn_params),
+            check=is_usable
+            if self.settings_dict["CONN_HEALTH_CHECKS"]
+            else None,
+        )
+        if opened:
+            DB_CONNECTIONS_OPENED.inc()
+        DB_POOL_CHECKOUTS.labels(result="opened" if opened else "reused").inc()
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.put(self.connection)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -66,6 +67,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.RequestMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -99,6 +101,9 @@ WSGI_APPLICATION = "foodgram.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Время жизни соединения в секундах, пустое значение - без ограничения
+DB_CONN_MAX_AGE = os.getenv("DB_CONN_MAX_AGE", default="60")
+
 DATABASES = {
     "default": {
         "ENGINE": os.getenv(
@@ -109,9 +114,146 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", default="postgres"),
         "HOST": os.getenv("DB_HOST", default="localhost"),
         "PORT": os.getenv("DB_PORT", default="5432"),
+        "CONN_MAX_AGE": int(DB_CONN_MAX_AGE) if DB_CONN_MAX_AGE else None,
+        "CONN_HEALTH_CHECKS": os.getenv(
+            "DB_CONN_HEALTH_CHECKS", default="True"
+        )
+        == "True",
+        # Совместимость с PgBouncer в режиме пула транзакций
+        "DISABLE_SERVER_SIDE_CURSORS": os.getenv(
+            "DB_PGBOUNCER", default="False"
+        )
+        == "True",
+        "POOL": {
+            "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", default=10)),
+            "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", default=30)),
+        },
+        "TEST": {"NAME": os.getenv("DB_TEST_NAME") or None},
+    }
+}
+# Тестовая БД SQLite - файл: в памяти параллельные запросы тестов
+# конкурентного доступа блокируют друг друга
+if (
+    DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+    and not DATABASES["default"]["TEST"]["NAME"]
+):
+    DATABASES["default"]["TEST"]["NAME"] = os.path.join(
+        tempfile.gettempdir(), "foodgram_test.sqlite3"
+    )
+
+# Пул соединений внутри процесса: соединение возвращается в пул
+# в конце запроса, поэтому постоянные соединения Django отключаются
+if os.getenv("DB_POOL", default="False") == "True":
+    DATABASES["default"]["ENGINE"] = "foodgram.db"
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+# Режим сервера: wsgi - синхронные воркеры gunicorn, asgi - воркеры uvicorn
+# с асинхронными представлениями для чтения. В режиме asgi синхронный код
+# выполняется в новых потоках, постоянные соединения в них не
+# переиспользуются, поэтому без пула они отключаются
+SERVER_MODE = os.getenv("SERVER_MODE", default="wsgi")
+ASYNC_VIEWS = SERVER_MODE == "asgi"
+if ASYNC_VIEWS:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+# Кэш по умолчанию локален для процесса: версии кэша ответов, токены и
+# журнал изменений индекса рецептов (what_to_cook) не доходят до других
+# воркеров. При нескольких воркерах нужен общий кэш, например Redis.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", default=""),
     }
 }
 
+# Лента подписок: максимальная длина ленты, порог подписчиков, после
+# которого рецепты автора читаются напрямую, размер пачки раскладки и
+# число потоков фоновой раскладки.
+FEED_MAX_LENGTH = int(os.getenv("FEED_MAX_LENGTH", default=500))
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", default=10000))
+FEED_BATCH_SIZE = int(os.getenv("FEED_BATCH_SIZE", default=1000))
+FEED_WORKERS = int(os.getenv("FEED_WORKERS", default=1))
+
+# Конфигурация полнотекстового поиска рецептов в PostgreSQL
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", default="russian")
+
+# Фоновая обработка изображений рецептов: число потоков и формат вариантов
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", default=2))
+IMAGE_RENDITION_FORMAT = os.getenv("IMAGE_RENDITION_FORMAT", default="WEBP")
+
+# Ограничения загружаемых изображений: размер в байтах и число пикселей
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv("IMAGE_UPLOAD_MAX_BYTES", default=10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.getenv("IMAGE_UPLOAD_MAX_PIXELS", default=40_000_000)
+)
+
+# Максимальное число id в одном пакетном запросе избранного, списка
+# покупок и подписок
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", default=500))
+
+# Время жизни записи кэша аутентификации по токену в секундах, 0 - без
+# кэша. С кэшем, локальным для процесса, выход в одном воркере не виден
+# остальным, поэтому по умолчанию токены кэшируются только в общем кэше.
+TOKEN_CACHE_TIMEOUT = int(
+    os.getenv(
+        "TOKEN_CACHE_TIMEOUT",
+        default=(
+            0 if CACHES["default"]["BACKEND"].endswith(".LocMemCache") else 300
+        ),
+    )
+)
+
+# Токен доступа к /api/metrics в заголовке Authorization: Bearer,
+# без токена метрики не отдаются
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", default="")
+
+# Метрики запросов: доля запросов с замерами, бюджет SQL запросов на
+# запрос по умолчанию и для отдельных представлений списком
+# "имя_представления=бюджет" через запятую
+REQUEST_METRICS_SAMPLE_RATE = float(
+    os.getenv("REQUEST_METRICS_SAMPLE_RATE", default=0.05)
+)
+REQUEST_METRICS_QUERY_BUDGET = int(
+    os.getenv("REQUEST_METRICS_QUERY_BUDGET", default=20)
+)
+REQUEST_METRICS_VIEW_QUERY_BUDGETS = {
+    view_name: int(budget)
+    for view_name, budget in (
+        item.split("=")
+        for item in os.getenv(
+            "REQUEST_METRICS_VIEW_QUERY_BUDGETS",
+            default=(
+                "api:recipes-list=6,api:recipes-detail=6,"
+                "api:users-subscriptions=5,"
+                "api:recipes-download-shopping-cart=3"
+            ),
+        ).split(",")
+        if item
+    )
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "api.middleware": {
+            "handlers": ["console"],
+            "level": os.getenv("REQUEST_METRICS_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -165,7 +307,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend"
@@ -0,0 +1,45 @@
+"""
+Настройки gunicorn.
+
+SERVER_MODE=wsgi запускает синхронное приложение с воркерами
+GUNICORN_WORKER_CLASS (sync или gthread), SERVER_MODE=asgi - приложение
+ASGI с воркерами uvicorn и асинхронными представлениями для чтения.
+Метрики Prometheus воркеров пишутся в общий каталог
+PROMETHEUS_MULTIPROC_DIR и суммируются при выдаче /api/metrics.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("GUNICORN_BIND", default="0:8000")
+workers = int(
+    os.getenv("GUNICORN_WORKERS", default=multiprocessing.cpu_count() * 2 + 1)
+)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", default=30))
+
+if os.getenv("SERVER_MODE", default="wsgi") == "asgi":
+    wsgi_app = "foodgram.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "foodgram.wsgi:application"
+    worker_class = os.getenv("GUNICORN_WORKER_CLASS", default="sync")
+    threads = int(os.getenv("GUNICORN_THREADS", default=1))
+
+# Задается до запуска воркеров, чтобы prometheus_client в каждом из них
+# работал в многопроцессном режиме
+prometheus_multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus"
+)
+
+
+def on_starting(server):
+    """Пустой каталог метрик при запуске, файлы прошлого запуска удаляются"""
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir)
+
+
+def child_exit(server, worker):
+    """Пометка метрик завершившегося воркера"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -45,11 +45,12 @@ class RecipeAdmin(admin.ModelAdmin):
 
     def added_to_favorite_times(self, obj):
         """Общее число раз рецепт добавлен в избраное"""
-        return obj.favorite.all().count()
+        return obj.favorites_count
 
     added_to_favorite_times.short_description = (
         "Рецепт добавлен в избранное раз"
     )
+    added_to_favorite_times.admin_order_field = "favorites_count"
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -90,7 +91,7 @@ class CartAdmin(admin.ModelAdmin):
     Админ-модель для модели Cart
     """
 
-    list_display = ("id", "user", "recipe")
+    list_display = ("id", "user", "recipe", "portions")
     search_fields = ("user", "recipe")
     list_filter = ("user", "recipe")
     empty_value_display = "-пусто-"
@@ -0,0 +1,163 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Для обычных авторов лента материализуется при записи: новый рецепт
+раскладывается пачками в FeedEntry подписчиков, длина ленты ограничена
+FEED_MAX_LENGTH. Рецепты авторов, у которых подписчиков больше
+FEED_FANOUT_LIMIT, не раскладываются, а читаются напрямую при запросе ленты.
+
+Раскладка выполняется после коммита в пуле потоков процесса и не держит
+транзакцию запроса. Потерянные при перезапуске задачи восстанавливает
+команда backfill-feed.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+PULL_AUTHORS_KEY = "feed:pull_authors"
+PULL_AUTHORS_TIMEOUT = 60 * 10
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.FEED_WORKERS, thread_name_prefix="recipe-feed"
+)
+
+
+def get_pull_authors():
+    """Авторы, рецепты которых читаются в ленту напрямую"""
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = list(
+            Follow.objects.order_by()
+            .values("author")
+            .annotate(total=Count("pk"))
+            .filter(total__gt=settings.FEED_FANOUT_LIMIT)
+            .values_list("author", flat=True)
+        )
+        cache.set(PULL_AUTHORS_KEY, authors, PULL_AUTHORS_TIMEOUT)
+
+    return authors
+
+
+def trim_feeds(user_ids):
+    """Удаление записей сверх FEED_MAX_LENGTH в лентах пользователей"""
+    overflow = (
+        FeedEntry.objects.filter(user_id__in=user_ids)
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("user"),
+                order_by=(F("created").desc(), F("recipe").desc()),
+            )
+        )
+        .filter(position__gt=settings.FEED_MAX_LENGTH)
+        .values_list("pk", flat=True)
+    )
+    overflow = list(overflow)
+    if overflow:
+        FeedEntry.objects.filter(pk__in=overflow).delete()
+
+
+def fan_out(recipe):
+    """Разложить новый рецепт в ленты подписчиков автора"""
+    followers = Follow.objects.filter(author_id=recipe.author_id).order_by()
+    if followers.count() > settings.FEED_FANOUT_LIMIT:
+        return
+
+    user_ids = followers.values_list("user_id", flat=True).iterator()
+    while batch := list(islice(user_ids, settings.FEED_BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id, recipe=recipe, created=recipe.created
+                )
+                for user_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        trim_feeds(batch)
+
+
+def fan_out_in_background(recipe_id):
+    """Раскладка рецепта в фоновом потоке со своим соединением с БД"""
+    close_old_connections()
+    try:
+        recipe = (
+            Recipe.objects.only("pk", "author", "created")
+            .filter(pk=recipe_id)
+            .first()
+        )
+        if recipe is not None:
+            fan_out(recipe)
+    except Exception:
+        logger.exception("Ошибка раскладки рецепта %s в ленты", recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_fan_out(recipe):
+    """Поставить раскладку рецепта в ленты в очередь после коммита"""
+    transaction.on_commit(
+        lambda: executor.submit(fan_out_in_background, recipe.pk)
+    )
+
+
+def backfill(follows):
+    """Заполнить ленты последними рецептами авторов из подписок"""
+    follows = follows.exclude(author__in=get_pull_authors()).order_by("pk")
+    follows = follows.values_list("user_id", "author_id").iterator()
+    while batch := list(islice(follows, settings.FEED_BATCH_SIZE)):
+        recipes = (
+            Recipe.objects.filter(author__in={author for _, author in batch})
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=(F("created").desc(), F("id").desc()),
+                )
+            )
+            .filter(position__lte=settings.FEED_MAX_LENGTH)
+            .values_list("author", "pk", "created")
+        )
+        by_author = {}
+        for author, pk, created in recipes:
+            by_author.setdefault(author, []).append((pk, created))
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user, recipe_id=pk, created=created)
+                for user, author in batch
+                for pk, created in by_author.get(author, ())
+            ],
+            batch_size=settings.FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        trim_feeds({user for user, _ in batch})
+
+
+def remove(user_id, *author_ids):
+    """Убрать из ленты рецепты авторов после отписки"""
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def get_feed(user):
+    """Рецепты ленты пользователя"""
+    return Recipe.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values("recipe"))
+        | Q(
+            author__in=Follow.objects.filter(
+                user=user, author__in=get_pull_authors()
+            ).values("author")
+        )
+    )
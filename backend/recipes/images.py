@@ -0,0 +1,90 @@
+"""
+Фоновая обработка изображений рецептов.
+
+После сохранения рецепта оригинал изображения в пуле потоков процесса
+уменьшается до набора размеров и пересохраняется в WebP без метаданных.
+Пути готовых вариантов записываются в Recipe.image_renditions, пока их
+нет, отдается оригинал. Потерянные при перезапуске задачи дообрабатывает
+команда process-images.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    "thumbnail": (160, 160),
+    "card": (640, 640),
+    "full": (1600, 1600),
+}
+RENDITION_FORMATS = {
+    "WEBP": "webp",
+    "JPEG": "jpg",
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix="recipe-images"
+)
+
+
+def make_renditions(recipe):
+    """Построить и сохранить все варианты изображения рецепта"""
+    image_format = settings.IMAGE_RENDITION_FORMAT
+    extension = RENDITION_FORMATS[image_format]
+    with recipe.image.open("rb") as file:
+        original = ImageOps.exif_transpose(Image.open(file)).convert("RGB")
+
+    renditions = {}
+    for name, size in RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        buffer = BytesIO()
+        image.save(buffer, image_format, quality=85)
+        path = f"media/recipes/renditions/{recipe.pk}_{name}.{extension}"
+        default_storage.delete(path)
+        renditions[name] = default_storage.save(
+            path, ContentFile(buffer.getvalue())
+        )
+
+    return renditions
+
+
+def process(recipe_id):
+    """Построить варианты изображения рецепта и записать пути в рецепт"""
+    recipe = Recipe.objects.only("pk", "image").filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        image_renditions=make_renditions(recipe)
+    )
+
+
+def process_in_background(recipe_id):
+    """Обработка изображения в фоновом потоке со своим соединением с БД"""
+    close_old_connections()
+    try:
+        process(recipe_id)
+    except Exception:
+        logger.exception("Ошибка обработки изображения рецепта %s", recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(recipe):
+    """Поставить обработку изображения в очередь после коммита"""
+    if recipe.image_renditions:
+        Recipe.objects.filter(pk=recipe.pk).update(image_renditions={})
+        recipe.image_renditions = {}
+    transaction.on_commit(
+        lambda: executor.submit(process_in_background, recipe.pk)
+    )
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from recipes import feed
+from recipes.models import FeedEntry
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    """
+    Команда заполнения лент подписок по существующим подпискам.
+
+    Повторный запуск безопасен: уже существующие записи пропускаются.
+    """
+
+    help = "Backfill subscription feeds from existing follows"
+
+    def handle(self, *args, **options):
+        initial_count = FeedEntry.objects.count()
+        feed.backfill(Follow.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Добавлено записей ленты: "
+                f"{FeedEntry.objects.count() - initial_count}"
+            )
+        )
@@ -0,0 +1,62 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from api.shopping_cart import get_shopping_list
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Команда для вывода планов основных запросов ленты рецептов.
+
+    На PostgreSQL выполняет EXPLAIN ANALYZE, на остальных СУБД простой
+    EXPLAIN. Используется для проверки работы индексов на наполненной БД.
+    """
+
+    help = "Explain main recipe feed queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            help="id пользователя для персональных запросов",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=6,
+            help="Размер страницы ленты",
+        )
+
+    def get_queries(self, user, limit):
+        """Запросы ленты в том виде, в каком их строит API"""
+        feed = Recipe.objects.with_user_flags(user)
+        tag_slug = Tag.objects.values_list("slug", flat=True).first()
+        return {
+            "Лента": feed[:limit],
+            "Лента автора": feed.filter(author=user)[:limit],
+            "Лента по тегу": feed.filter(tags__slug=tag_slug)[:limit],
+            "Избранное": feed.filter(is_favorited=True)[:limit],
+            "Список покупок": feed.filter(is_in_shopping_cart=True)[:limit],
+            "Выгрузка списка покупок": get_shopping_list(user),
+        }
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user = User.objects.get(pk=options["user"])
+        else:
+            user = User.objects.order_by("pk").first()
+        if user is None:
+            raise CommandError("В БД нет пользователей")
+
+        analyze = connection.vendor == "postgresql"
+        queries = self.get_queries(user, options["limit"])
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(
+                queryset.explain(analyze=True)
+                if analyze
+                else queryset.explain()
+            )
+            self.stdout.write("")
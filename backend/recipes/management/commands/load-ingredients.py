@@ -1,44 +1,115 @@
+import csv
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
+from api.cache import bump_cache_version
 from recipes.models import Ingredient
 
-MODEL_AND_FILE_TABLE = {
-    Ingredient: "ingredients.json",
-}
+DEFAULT_FILE = f"{settings.BASE_DIR}/static/data/ingredients.json"
+CHUNK_SIZE = 64 * 1024
+
 
+def read_csv(file):
+    """Построчное чтение ингредиентов из csv: название,единица"""
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
 
-def check_exists_models(table):
-    for model, _ in table.items():
-        if model.objects.exists():
-            print("Такие данные уже существуют")
-            continue
+
+def read_json(file):
+    """Потоковое чтение массива ингредиентов из json по объектам"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in "[, \r\n\t":
+                position += 1
+            if position >= len(buffer) or buffer[position] == "]":
+                break
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield row["name"], row["measurement_unit"]
+        if not chunk:
+            return
+
+
+READERS = {
+    "csv": read_csv,
+    "json": read_json,
+}
 
 
 class Command(BaseCommand):
     """
-    Команда для переноса данных из csv-файлов в БД Django.
+    Команда для загрузки ингредиентов из csv/json файла в БД Django.
 
-    При старте осуществляет дополнительно простую проверку,
-    существуют ли такие модели данных в БД.
+    Файл читается потоково и вставляется пачками, уже существующие пары
+    (название, единица измерения) пропускаются, поэтому команду можно
+    запускать повторно.
     """
 
-    help = "Import csv to models in Django db"
+    help = "Import ingredients from csv/json file to Django db"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            default=DEFAULT_FILE,
+            help="Путь к файлу с ингредиентами",
+        )
+        parser.add_argument(
+            "--format",
+            choices=tuple(READERS),
+            help="Формат файла, по умолчанию определяется по расширению",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Размер пачки вставки",
+        )
 
-    def handle(self, *args, **kwargs):
-        check_exists_models(MODEL_AND_FILE_TABLE)
+    def handle(self, *args, **options):
+        file_location = options["file"]
+        file_format = options["format"] or Path(file_location).suffix[1:]
+        if file_format not in READERS:
+            raise CommandError(f"Неизвестный формат файла: {file_format}")
 
-        for model, file in MODEL_AND_FILE_TABLE.items():
-            file_location = f"{settings.BASE_DIR}/static/data/{file}"
+        batch_size = options["batch_size"]
+        initial_count = Ingredient.objects.count()
+        total = 0
+        start = time.monotonic()
+        with open(file_location, "r", encoding="utf-8") as file:
+            rows = READERS[file_format](file)
+            while batch := list(islice(rows, batch_size)):
+                Ingredient.objects.bulk_create(
+                    [
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in batch
+                    ],
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+                total += len(batch)
 
-            with open(file_location, "r", encoding="utf-8") as json_file:
-                reader = json.load(json_file)
-                for row in reader:
-                    if model == Ingredient:
-                        data = model(
-                            name=row["name"],
-                            measurement_unit=row["measurement_unit"],
-                        )
-                        data.save()
+        bump_cache_version("ingredients")
+        elapsed = time.monotonic() - start
+        created = Ingredient.objects.count() - initial_count
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано строк: {total}, добавлено: {created}, "
+                f"{elapsed:.2f} с ({total / max(elapsed, 1e-9):.0f} строк/с)"
+            )
+        )
@@ -0,0 +1,43 @@
+from django.core.management import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Команда построения вариантов изображений рецептов.
+
+    Обрабатывает рецепты без готовых вариантов, например задачи,
+    потерянные при перезапуске процесса. С --all пересобирает все.
+    """
+
+    help = "Build resized renditions of recipe images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересобрать варианты для всех рецептов",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+        if not options["all"]:
+            recipes = recipes.filter(image_renditions={})
+
+        processed = 0
+        failed = 0
+        for recipe_id in list(recipes.values_list("pk", flat=True)):
+            try:
+                images.process(recipe_id)
+                processed += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Рецепт {recipe_id}: {error}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано рецептов: {processed}, с ошибками: {failed}"
+            )
+        )
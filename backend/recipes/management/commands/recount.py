@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+from django.db.models import Max
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Команда пересчета счетчиков избранного и списков покупок рецептов.
+
+    Исправляет расхождения счетчиков со связями, обходя рецепты
+    диапазонами id, чтобы не блокировать всю таблицу одним запросом.
+    """
+
+    help = "Recount favorites and shopping cart counters of recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество рецептов в одном запросе",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_pk = Recipe.objects.aggregate(last=Max("pk"))["last"] or 0
+        total = 0
+        for start in range(0, last_pk + 1, batch_size):
+            total += Recipe.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).recount()
+
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано рецептов: {total}"))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:54
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Слияние дублей ингредиентов, созданных повторной загрузкой"""
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    IngredientRecipe = apps.get_model("recipes", "IngredientRecipe")
+    kept = {}
+    for pk, name, unit in Ingredient.objects.order_by("pk").values_list(
+        "pk", "name", "measurement_unit"
+    ):
+        original = kept.setdefault((name, unit), pk)
+        if original != pk:
+            IngredientRecipe.objects.filter(ingredient_id=pk).update(
+                ingredient_id=original
+            )
+            Ingredient.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "recipes",
+            "0002_alter_favorite_options_alter_ingredient_options_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(
+                fields=("name", "measurement_unit"),
+                name="unique_ingredient_unit",
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0003_ingredient_unique_name_unit"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="favorite",
+            options={
+                "ordering": ("-id",),
+                "verbose_name": "избранный рецепт",
+                "verbose_name_plural": "избранные рецепты",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="ingredientrecipe",
+            options={
+                "ordering": ("id",),
+                "verbose_name": "ингредиент в рецепте",
+                "verbose_name_plural": "ингридиенты в рецепте",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="recipe",
+            options={
+                "ordering": ("-created", "-id"),
+                "verbose_name": "рецепт",
+                "verbose_name_plural": "рецепты",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="shoppingcart",
+            options={
+                "ordering": ("-id",),
+                "verbose_name": "список покупок",
+                "verbose_name_plural": "списки покупок",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ingredientrecipe",
+            index=models.Index(
+                fields=["recipe", "ingredient", "amount"],
+                name="ingredient_recipe_cover_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-created", "-id"], name="recipe_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["author", "-created"], name="recipe_author_created_idx"
+            ),
+        ),
+    ]
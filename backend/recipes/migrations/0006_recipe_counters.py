@@ -0,0 +1,63 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Начальное заполнение счетчиков по существующим связям"""
+    Recipe = apps.get_model("recipes", "Recipe")
+    counters = {
+        "favorites_count": apps.get_model("recipes", "Favorite"),
+        "in_carts_count": apps.get_model("recipes", "ShoppingCart"),
+    }
+    Recipe.objects.update(
+        **{
+            field: Coalesce(
+                Subquery(
+                    model.objects.filter(recipe=OuterRef("pk"))
+                    .values("recipe")
+                    .annotate(total=Count("pk"))
+                    .values("total")
+                ),
+                0,
+            )
+            for field, model in counters.items()
+        }
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0004_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Добавлений в избранное",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Добавлений в список покупок",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-favorites_count", "-created"],
+                name="recipe_popularity_idx",
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.1 on 2026-10-18 04:13
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+FILL_SEARCH_VECTOR = """
+UPDATE recipes_recipe AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM recipes_ingredientrecipe AS link
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = link.ingredient_id
+        WHERE link.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+"""
+
+
+def create_search_indexes(apps, schema_editor):
+    """GIN индексы поиска и заполнение вектора, только в PostgreSQL"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX recipe_search_vector_idx ON recipes_recipe "
+        "USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX recipe_name_trgm_idx ON recipes_recipe "
+        "USING gin (name gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        FILL_SEARCH_VECTOR, {"config": settings.SEARCH_CONFIG}
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS recipe_search_vector_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS recipe_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0008_recipe_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 04:16
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0009_recipe_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shoppingcart",
+            name="portions",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="Число порций",
+            ),
+        ),
+    ]
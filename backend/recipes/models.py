@@ -1,5 +1,31 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+    TrigramSimilarity,
+)
+from django.core.validators import MinValueValidator
+from django.db import connections, models, transaction
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Follow
 
 User = get_user_model()
 
@@ -31,12 +57,167 @@ class Ingredient(models.Model):
         verbose_name = "ингридиент"
         verbose_name_plural = "ингридиенты"
         ordering = ("name",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "measurement_unit"],
+                name="unique_ingredient_unit",
+            )
+        ]
 
     def __str__(self) -> str:
         """Строковое представление модели"""
         return f"{self.name} - {self.measurement_unit}"
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов"""
+
+    def with_related(self):
+        """Подгрузка автора, тегов и ингредиентов фиксированным числом
+        запросов, без поискового вектора"""
+        return (
+            self.select_related("author")
+            .defer("search_vector")
+            .prefetch_related(
+                "tags",
+                Prefetch(
+                    "recipe_ingredient",
+                    queryset=IngredientRecipe.objects.select_related(
+                        "ingredient"
+                    ),
+                ),
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Аннотация флагов избранного, списка покупок и подписки на автора
+        для пользователя"""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            author_is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef("author"))
+            ),
+        )
+
+    def recount(self):
+        """Пересчет счетчиков избранного и списков покупок по связям"""
+        return self.update(
+            favorites_count=Coalesce(
+                Subquery(
+                    Favorite.objects.filter(recipe=OuterRef("pk"))
+                    .values("recipe")
+                    .annotate(total=Count("pk"))
+                    .values("total")
+                ),
+                0,
+            ),
+            in_carts_count=Coalesce(
+                Subquery(
+                    ShoppingCart.objects.filter(recipe=OuterRef("pk"))
+                    .values("recipe")
+                    .annotate(total=Count("pk"))
+                    .values("total")
+                ),
+                0,
+            ),
+        )
+
+    def is_postgresql(self):
+        """Полнотекстовый поиск доступен только в PostgreSQL"""
+        return connections[self.db].vendor == "postgresql"
+
+    def update_search_vector(self):
+        """
+        Пересчет поискового вектора по названию, описанию и названиям
+        ингредиентов рецептов.
+
+        На остальных СУБД вектор не используется и не заполняется.
+        """
+        if not self.is_postgresql():
+            return 0
+
+        # Агрегаты contrib.postgres требуют драйвер PostgreSQL
+        from django.contrib.postgres.aggregates import StringAgg
+
+        config = settings.SEARCH_CONFIG
+        ingredient_names = Subquery(
+            IngredientRecipe.objects.filter(recipe=OuterRef("pk"))
+            .values("recipe")
+            .annotate(names=StringAgg("ingredient__name", " "))
+            .values("names")
+        )
+        return self.update(
+            search_vector=SearchVector("name", weight="A", config=config)
+            + SearchVector(
+                Coalesce(
+                    ingredient_names,
+                    Value(""),
+                    output_field=models.TextField(),
+                ),
+                weight="B",
+                config=config,
+            )
+            + SearchVector("text", weight="C", config=config)
+        )
+
+    def search(self, text):
+        """
+        Рецепты, подходящие под поисковую строку, по убыванию релевантности.
+
+        В PostgreSQL - полнотекстовый поиск с ранжированием ts_rank и
+        поиском по триграммам названия для запросов с опечатками, на
+        остальных СУБД - поиск подстроки в названии, описании и
+        ингредиентах.
+        """
+        if not self.is_postgresql():
+            return (
+                self.filter(
+                    Q(name__icontains=text)
+                    | Q(text__icontains=text)
+                    | Exists(
+                        IngredientRecipe.objects.filter(
+                            recipe=OuterRef("pk"),
+                            ingredient__name__icontains=text,
+                        )
+                    )
+                )
+                .annotate(
+                    rank=Case(
+                        When(name__icontains=text, then=Value(1.0)),
+                        default=Value(0.5),
+                        output_field=FloatField(),
+                    )
+                )
+                .order_by("-rank", "-created", "-id")
+            )
+
+        query = SearchQuery(
+            text, config=settings.SEARCH_CONFIG, search_type="websearch"
+        )
+        return (
+            self.filter(
+                Q(search_vector=query) | TrigramSimilar(F("name"), text)
+            )
+            .annotate(
+                rank=SearchRank(F("search_vector"), query),
+                similarity=TrigramSimilarity("name", text),
+            )
+            .order_by("-rank", "-similarity", "-created", "-id")
+        )
+
+
 class Recipe(models.Model):
     """Модель рецепта"""
 
@@ -60,16 +241,47 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag)
     cooking_time = models.PositiveIntegerField("Время приготовления в минутах")
     created = models.DateTimeField("дата создания", auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        "Добавлений в избранное", default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        "Добавлений в список покупок", default=0, editable=False
+    )
+    image_renditions = models.JSONField(
+        "Варианты изображения", default=dict, blank=True, editable=False
+    )
+    # GIN индексы вектора и триграмм названия создаются миграцией
+    # только в PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "рецепт"
         verbose_name_plural = "рецепты"
-        ordering = ("-created",)
+        ordering = ("-created", "-id")
+        indexes = [
+            models.Index(
+                fields=["-created", "-id"], name="recipe_created_id_idx"
+            ),
+            models.Index(
+                fields=["author", "-created"],
+                name="recipe_author_created_idx",
+            ),
+            models.Index(
+                fields=["-favorites_count", "-created"],
+                name="recipe_popularity_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         """Строковое представление модели"""
         return f"Рецепт {self.name} пользователя {self.author}"
 
+    def get_image(self, rendition):
+        """Путь к варианту изображения или к оригиналу, пока его нет"""
+        return self.image_renditions.get(rendition) or self.image.name
+
 
 class IngredientRecipe(models.Model):
     """Промежуточная модель связи ингридентов и рецептов"""
@@ -85,7 +297,13 @@ class IngredientRecipe(models.Model):
     class Meta:
         verbose_name = "ингредиент в рецепте"
         verbose_name_plural = "ингридиенты в рецепте"
-        ordering = ("-recipe__created",)
+        ordering = ("id",)
+        indexes = [
+            models.Index(
+                fields=["recipe", "ingredient", "amount"],
+                name="ingredient_recipe_cover_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         """Строковое представление модели"""
@@ -95,6 +313,88 @@ class IngredientRecipe(models.Model):
         )
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    """
+    Связи пользователя с рецептом: избранное и список покупок.
+
+    Добавление и удаление выполняются одним запросом без предварительной
+    проверки, поэтому параллельные запросы одной пары не приводят к
+    IntegrityError. Запросы не вызывают сигналы моделей, счетчик рецепта
+    counter_field обновляется тем же запросом в PostgreSQL и отдельным
+    в остальных БД.
+    """
+
+    def _change(self, link_sql, params, recipe, delta):
+        """
+        Выполнить запрос link_sql, возвращающий recipe_id измененной
+        связи, и изменить счетчик рецепта на delta. Возвращает, была ли
+        связь изменена.
+        """
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        field = self.model.counter_field
+        if connection.vendor == "postgresql":
+            counter = quote_name(field)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"WITH link AS ({link_sql}) "
+                    f"UPDATE {quote_name(Recipe._meta.db_table)} "
+                    f"SET {counter} = GREATEST({counter} + %s, 0) "
+                    f"WHERE {quote_name(Recipe._meta.pk.column)} IN "
+                    f"(SELECT {self._column('recipe')} FROM link) "
+                    "RETURNING 1",
+                    (*params, delta),
+                )
+                return cursor.fetchone() is not None
+
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            cursor.execute(link_sql, params)
+            changed = cursor.fetchone() is not None
+            if changed:
+                Recipe.objects.using(self.db).filter(pk=recipe.pk).update(
+                    **{field: Greatest(F(field) + delta, 0)}
+                )
+        return changed
+
+    def _column(self, name):
+        """Экранированное имя столбца поля модели"""
+        return connections[self.db].ops.quote_name(
+            self.model._meta.get_field(name).column
+        )
+
+    def add(self, user, recipe, **fields):
+        """Добавить рецепт, False если он уже добавлен"""
+        connection = connections[self.db]
+        values = {"user": user.pk, "recipe": recipe.pk}
+        for field in self.model._meta.concrete_fields:
+            if field.name not in values and not field.primary_key:
+                values[field.name] = field.get_db_prep_save(
+                    fields.get(field.name, field.get_default()), connection
+                )
+        columns = ", ".join(self._column(name) for name in values)
+        placeholders = ", ".join(["%s"] * len(values))
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        return self._change(
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT DO NOTHING RETURNING {self._column('recipe')}",
+            list(values.values()),
+            recipe,
+            1,
+        )
+
+    def remove(self, user, recipe):
+        """Удалить рецепт, False если его не было"""
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        return self._change(
+            f"DELETE FROM {table} WHERE {self._column('user')} = %s "
+            f"AND {self._column('recipe')} = %s "
+            f"RETURNING {self._column('recipe')}",
+            [user.pk, recipe.pk],
+            recipe,
+            -1,
+        )
+
+
 class ShoppingCart(models.Model):
     """Список покупок"""
 
@@ -104,11 +404,20 @@ class ShoppingCart(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, related_name="cart"
     )
+    portions = models.PositiveSmallIntegerField(
+        "Число порций",
+        default=1,
+        validators=[MinValueValidator(1)],
+    )
+
+    counter_field = "in_carts_count"
+
+    objects = UserRecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "список покупок"
         verbose_name_plural = "списки покупок"
-        ordering = ("-recipe__created",)
+        ordering = ("-id",)
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "recipe"], name="unique_recipe_cart"
@@ -130,10 +439,14 @@ class Favorite(models.Model):
         Recipe, on_delete=models.CASCADE, related_name="favorite"
     )
 
+    counter_field = "favorites_count"
+
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = "избранный рецепт"
         verbose_name_plural = "избранные рецепты"
-        ordering = ("-recipe__created",)
+        ordering = ("-id",)
         constraints = [
             models.UniqueConstraint(
                 fields=["user", "recipe"], name="unique_recipe_favorite"
@@ -143,3 +456,35 @@ class Favorite(models.Model):
     def __str__(self) -> str:
         """Строковое представление модели"""
         return f"Список избранного пользователя {self.user}"
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок пользователя"""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    created = models.DateTimeField("дата создания рецепта")
+
+    class Meta:
+        verbose_name = "запись ленты"
+        verbose_name_plural = "записи ленты"
+        ordering = ("-created", "-recipe_id")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-created", "-recipe"],
+                name="feed_entry_user_created_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """Строковое представление модели"""
+        return f"Лента пользователя {self.user}"
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes import feed
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+)
+from users.models import Follow
+
+recipe_updates_deferred = ContextVar("recipe_updates_deferred", default=False)
+
+
+@contextmanager
+def defer_recipe_updates():
+    """
+    Отключить пересчет поискового вектора и индекса ингредиентов рецепта
+    сигналами: вызывающий код обновляет их сам один раз после записи.
+    """
+    token = recipe_updates_deferred.set(True)
+    try:
+        yield
+    finally:
+        recipe_updates_deferred.reset(token)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_counter(sender, instance, created, **kwargs):
+    """Атомарное увеличение счетчика рецепта при добавлении"""
+    if created:
+        field = sender.counter_field
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            **{field: F(field) + 1}
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_counter(sender, instance, **kwargs):
+    """
+    Атомарное уменьшение счетчика рецепта при удалении.
+
+    При каскадном удалении самого рецепта обновление не затронет строк.
+    """
+    field = sender.counter_field
+    Recipe.objects.filter(pk=instance.recipe_id, **{f"{field}__gt": 0}).update(
+        **{field: F(field) - 1}
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Добавление рецептов автора в ленту нового подписчика"""
+    if created:
+        feed.backfill(Follow.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Follow)
+def clean_feed(sender, instance, **kwargs):
+    """Удаление рецептов автора из ленты после отписки"""
+    feed.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(sender, instance, update_fields, **kwargs):
+    """Пересчет поискового вектора при изменении названия или описания"""
+    if recipe_updates_deferred.get():
+        return
+    if update_fields is None or {"name", "text"} & set(update_fields):
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def update_search_vector_ingredients(sender, instance, **kwargs):
+    """
+    Пересчет поискового вектора при изменении ингредиентов рецепта.
+
+    Изменения ингредиентов в API обновляют вектор явно, при каскадном
+    удалении рецепта пересчет не нужен.
+    """
+    if recipe_updates_deferred.get():
+        return
+    if not isinstance(kwargs.get("origin"), Recipe):
+        Recipe.objects.filter(pk=instance.recipe_id).update_search_vector()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_search_vector_ingredient_name(sender, instance, created, **kwargs):
+    """Пересчет векторов рецептов с переименованным ингредиентом"""
+    if not created:
+        Recipe.objects.filter(
+            recipe_ingredient__ingredient=instance
+        ).update_search_vector()
@@ -1,3 +1,5 @@
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status, views, viewsets
 from rest_framework.decorators import action
@@ -5,6 +7,9 @@ from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from api.batch import SELF, apply_batch
+from api.metrics import LatencyMetricsMixin
+from api.middleware import SerializerMetricsMixin, get_serializer_data
 from api.serializers import (
     ChangePasswordSerializer,
     ObtainTokenSerializer,
@@ -12,6 +17,8 @@ from api.serializers import (
     ProfileSerializer,
     SubscriptionSerializer,
 )
+from recipes import feed
+from recipes.models import Recipe
 from users.models import Follow, User
 
 
@@ -54,6 +61,8 @@ class DeleteTokenView(views.APIView):
 
 
 class UsersViewSet(
+    LatencyMetricsMixin,
+    SerializerMetricsMixin,
     generics.ListCreateAPIView,
     generics.RetrieveAPIView,
     viewsets.GenericViewSet,
@@ -70,6 +79,45 @@ class UsersViewSet(
         """Получение всех пользователей"""
         return User.objects.all()
 
+    def get_recipes_limit(self):
+        """Лимит рецептов автора из параметра recipes_limit"""
+        try:
+            limit = int(self.request.query_params.get("recipes_limit"))
+        except (TypeError, ValueError):
+            return None
+
+        return limit if limit >= 0 else None
+
+    def get_authors_queryset(self):
+        """Авторы с числом рецептов, флагом подписки и последними рецептами"""
+        recipes = Recipe.objects.only(
+            "id",
+            "author",
+            "name",
+            "image",
+            "image_renditions",
+            "cooking_time",
+            "created",
+        )
+        limit = self.get_recipes_limit()
+        if limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=F("created").desc(),
+                )
+            ).filter(row_number__lte=limit)
+
+        return User.objects.annotate(
+            recipes_count=Count("recipes"),
+            is_subscribed=Exists(
+                Follow.objects.filter(
+                    user=self.request.user, author=OuterRef("pk")
+                )
+            ),
+        ).prefetch_related(Prefetch("recipes", queryset=recipes))
+
     @action(
         detail=False,
         methods=["GET"],
@@ -83,9 +131,11 @@ class UsersViewSet(
         """Профайл текущего пользователя."""
 
         return Response(
-            self.serializer_class(
-                self.request.user, context={"request": request}
-            ).data
+            get_serializer_data(
+                self.serializer_class(
+                    self.request.user, context={"request": request}
+                )
+            )
         )
 
     @action(
@@ -127,7 +177,8 @@ class UsersViewSet(
             serializer.save()
             return Response(
                 ProfileGetSerializer(
-                    context={"request": request}, instance=author
+                    context={"request": request},
+                    instance=self.get_authors_queryset().get(pk=author.pk),
                 ).data
             )
 
@@ -138,6 +189,30 @@ class UsersViewSet(
 
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=["POST", "DELETE"],
+        url_path="subscribe",
+        url_name="subscribe-batch",
+        permission_classes=[
+            IsAuthenticated,
+        ],
+    )
+    def subscribe_batch(self, request):
+        """Подписка и отписка от авторов списком id"""
+        user = request.user
+        return apply_batch(
+            request,
+            Follow,
+            "author",
+            User.objects.all(),
+            on_created=lambda author_ids: feed.backfill(
+                Follow.objects.filter(user=user, author_id__in=author_ids)
+            ),
+            on_deleted=lambda author_ids: feed.remove(user.pk, *author_ids),
+            rejected={user.pk: SELF},
+        )
+
     @action(
         detail=False,
         methods=["GET"],
@@ -148,18 +223,22 @@ class UsersViewSet(
     )
     def subscriptions(self, request):
         """Получить все подписки пользователя"""
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = self.get_authors_queryset().filter(
+            following__user=request.user
+        )
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = ProfileGetSerializer(
                 page, many=True, context={"request": request}
             )
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(get_serializer_data(serializer))
 
         return Response(
-            ProfileGetSerializer(
-                queryset,
-                many=True,
-                context={"request": request},
-            ).data
+            get_serializer_data(
+                ProfileGetSerializer(
+                    queryset,
+                    many=True,
+                    context={"request": request},
+                )
+            )
         )